@@ -1,17 +1,34 @@
 # ===============================
 # 🔹 IMPORTS
 # ===============================
+import array
 import asyncio
 import uuid
 import discord
 from discord.ext import commands, tasks
 from discord import Embed, app_commands
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient, APIConnectionError, APIStatusError
 
 import os
+import sys
 import time
+import math
 import random
+import heapq
+import itertools
+import collections
 import sqlite3
+import queue
+import threading
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import traceback
+import logging
+import logging.handlers
+import httpx
+from aiohttp import web
 from dotenv import load_dotenv
 
 # ===============================
@@ -21,15 +38,305 @@ load_dotenv()
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # ex.: servidor falso do bench/groq_mock.py
 FEEDBACK_CHANNEL_ID = int(os.getenv("FEEDBACK_CHANNEL_ID"))
 OWNER_ID = int(os.getenv("OWNER_ID"))
 
+# ===============================
+# 🔹 MÉTRICAS (HISTOGRAMAS POR ETAPA)
+# ===============================
+PERF_BITS = 3                      # 8 sub-buckets por potência de 2 (~6% de erro)
+PERF_BUCKETS = 256                 # cobre até ~2^32 µs (71 min)
+PERF_JANELA = 5                    # minutos da visão recente
+
+
+class Histograma:
+    # Buckets log-lineares estilo HDR em µs, memória fixa: o bucket é
+    # e * 8 + (us >> e), com e = expoente acima dos 4 bits mais altos.
+    __slots__ = ("contagens", "n", "soma", "maximo")
+
+    def __init__(self):
+        self.contagens = array.array("Q", bytes(8 * PERF_BUCKETS))
+        self.n = 0
+        self.soma = 0
+        self.maximo = 0
+
+    def registrar(self, us: int):
+        e = us.bit_length() - PERF_BITS - 1
+        if e < 0:
+            e = 0
+        i = (e << PERF_BITS) + (us >> e)
+        self.contagens[i if i < PERF_BUCKETS else PERF_BUCKETS - 1] += 1
+        self.n += 1
+        self.soma += us
+        if us > self.maximo:
+            self.maximo = us
+
+    def somar(self, outro: "Histograma"):
+        for i, c in enumerate(outro.contagens):
+            if c:
+                self.contagens[i] += c
+        self.n += outro.n
+        self.soma += outro.soma
+        self.maximo = max(self.maximo, outro.maximo)
+
+    def percentis(self, ps: tuple) -> list:
+        # vários percentis (em ordem crescente) numa única passada
+        alvos = [max(1, int(self.n * p + 0.999999)) for p in ps]
+        saida = []
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            if not c:
+                continue
+            acumulado += c
+            while alvos and acumulado >= alvos[0]:
+                e = max(0, (i >> PERF_BITS) - 1)
+                base = (i - (e << PERF_BITS)) << e
+                saida.append(min(base + (1 << e) // 2, self.maximo))
+                alvos.pop(0)
+            if not alvos:
+                break
+        return saida + [self.maximo] * len(alvos)
+
+    def percentil(self, p: float) -> int:
+        return self.percentis((p,))[0]
+
+
+class Etapa:
+    # Um histograma por minuto dos últimos PERF_JANELA; o minuto que sai
+    # da janela é somado ao acumulado. Cada medição toca um só histograma.
+    __slots__ = ("antigo", "minutos", "atual", "minuto")
+
+    def __init__(self):
+        self.antigo = Histograma()
+        self.minutos = collections.deque()  # (minuto, Histograma)
+        self.atual = None
+        self.minuto = None
+
+    def registrar(self, us: int, minuto: int):
+        if minuto != self.minuto:
+            self.minuto = minuto
+            self.atual = Histograma()
+            self.minutos.append((minuto, self.atual))
+            while self.minutos[0][0] <= minuto - PERF_JANELA:
+                self.antigo.somar(self.minutos.popleft()[1])
+        self.atual.registrar(us)
+
+    def recente(self, minuto: int) -> Histograma:
+        h = Histograma()
+        for m, parcial in self.minutos:
+            if m > minuto - PERF_JANELA:
+                h.somar(parcial)
+        return h
+
+    def total(self) -> Histograma:
+        h = Histograma()
+        h.somar(self.antigo)
+        for _, parcial in self.minutos:
+            h.somar(parcial)
+        return h
+
+
+class Perf:
+    def __init__(self):
+        self.etapas = {}
+        self.inicio = time.time()
+
+    def registrar(self, nome: str, segundos: float):
+        etapa = self.etapas.get(nome)
+        if etapa is None:
+            etapa = self.etapas[nome] = Etapa()
+        etapa.registrar(int(segundos * 1_000_000), int(time.monotonic()) // 60)
+
+    @contextlib.contextmanager
+    def medir(self, nome: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - t0)
+
+    def ranking(self, recente: bool = False) -> list:
+        # [(nome, Histograma)] por tempo total gasto, maior primeiro
+        minuto = int(time.monotonic() // 60)
+        linhas = []
+        for nome, etapa in self.etapas.items():
+            h = etapa.recente(minuto) if recente else etapa.total()
+            if h.n:
+                linhas.append((nome, h))
+        linhas.sort(key=lambda x: x[1].soma, reverse=True)
+        return linhas
+
+
+perf = Perf()
+
+
+def fmt_us(us: float) -> str:
+    if us < 1000:
+        return f"{us:.0f}µs"
+    if us < 1_000_000:
+        return f"{us / 1000:.1f}ms"
+    return f"{us / 1_000_000:.2f}s"
+
+
+LENTO_LIMITE = float(os.getenv("LENTO_LIMITE", "2.0"))          # s até concluir o comando
+LENTO_ACK_LIMITE = float(os.getenv("LENTO_ACK_LIMITE", "2.0"))  # s até o ack (o Discord corta em 3)
+LENTO_ARQUIVO = os.getenv(
+    "LENTO_ARQUIVO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "comandos_lentos.log")
+)
+LENTO_MAX_BYTES = 1024 * 1024
+
+
+class ComandosLentos:
+    # Tempo de cada slash command, do recebimento pelo Discord (created_at
+    # do snowflake, relógio de parede) até o ack e até concluir. Os lentos,
+    # expirados ou que falharam vão para um log rotativo em JSON por linha;
+    # quem escreve no arquivo é a thread do QueueListener, nunca o loop.
+    def __init__(self, arquivo: str):
+        self.expiradas = collections.Counter()  # comando -> quantas (erro 10062)
+        self.falhas = collections.Counter()     # comando -> quantas (check ou exceção)
+        self.lentos = 0
+
+        fila = queue.SimpleQueue()
+        self._logger = logging.getLogger("mari.lentos")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(logging.handlers.QueueHandler(fila))
+        arquivo = logging.handlers.RotatingFileHandler(
+            arquivo, maxBytes=LENTO_MAX_BYTES, backupCount=3, encoding="utf-8", delay=True
+        )
+        self._listener = logging.handlers.QueueListener(fila, arquivo)
+        self._listener.start()
+
+    def parar(self):
+        self._listener.stop()
+
+    def registrar(self, interaction: discord.Interaction, nome: str, fim: float):
+        recebida = interaction.created_at.timestamp()
+        ack = interaction.extras.get("ack")
+        expirou = interaction.extras.get("expirou", False)
+        falhou = interaction.command_failed
+        # max(0): o relógio local pode estar um pouco atrás do Discord
+        ack_s = max(0.0, ack - recebida) if ack else None
+        total = max(0.0, fim - recebida)
+
+        if ack_s is not None:
+            perf.registrar(f"ack.{nome}", ack_s)
+        if expirou:
+            self.expiradas[nome] += 1
+        if falhou:
+            self.falhas[nome] += 1
+
+        lento = total >= LENTO_LIMITE or (ack_s is not None and ack_s >= LENTO_ACK_LIMITE)
+        if not (expirou or falhou or lento):
+            return
+
+        self.lentos += 1
+        guild = interaction.guild
+        self._logger.info(json.dumps({
+            "quando": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "comando": nome,
+            "ack_ms": round(ack_s * 1000) if ack_s is not None else None,
+            "total_ms": round(total * 1000),
+            "expirou": expirou,
+            "falhou": falhou,
+            "guild_id": guild.id if guild else None,
+            "membros": guild.member_count if guild else None,
+            "user_id": interaction.user.id,
+            "args": {k: str(v)[:100] for k, v in interaction.namespace},
+        }, ensure_ascii=False))
+
+
+lentos = ComandosLentos(LENTO_ARQUIVO)
+
+
+class RespostaMedida(discord.InteractionResponse):
+    # marca em interaction.extras quando o Discord aceitou o ack
+    # (primeira resposta, defer, modal...) e se ele já tinha expirado.
+    # Não há hook público para o momento do ack (interaction_check e
+    # on_app_command_completion não veem a resposta), por isso a troca
+    # do objeto em _cs_response; o discord.py fica preso em 2.7.x no
+    # requirements.txt por causa disso e de CommandTree._call.
+    __slots__ = ()
+
+    async def _ack(self, coro):
+        try:
+            resultado = await coro
+        except discord.NotFound as e:
+            if e.code == 10062:  # Unknown interaction: passou dos 3s
+                self._parent.extras["expirou"] = True
+            raise
+        self._parent.extras.setdefault("ack", time.time())
+        return resultado
+
+    async def send_message(self, *args, **kwargs):
+        return await self._ack(super().send_message(*args, **kwargs))
+
+    async def defer(self, *args, **kwargs):
+        return await self._ack(super().defer(*args, **kwargs))
+
+    async def send_modal(self, *args, **kwargs):
+        return await self._ack(super().send_modal(*args, **kwargs))
+
+    async def edit_message(self, *args, **kwargs):
+        return await self._ack(super().edit_message(*args, **kwargs))
+
+
+class ArvoreMedida(app_commands.CommandTree):
+    # mede cada slash command: corpo inteiro (cmd.<nome>) e ack (ack.<nome>)
+    async def _call(self, interaction: discord.Interaction):
+        t0 = time.perf_counter()
+        interaction._cs_response = RespostaMedida(interaction)
+        try:
+            await super()._call(interaction)
+        finally:
+            if interaction.type is discord.InteractionType.application_command and interaction.command:
+                nome = interaction.command.qualified_name
+                perf.registrar(f"cmd.{nome}", time.perf_counter() - t0)
+                lentos.registrar(interaction, nome, time.time())
+
 # ===============================
 # 🔹 BOT CONFIG
 # ===============================
 intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="~", intents=intents)
-groq = Groq(api_key=GROQ_API_KEY)
+
+
+class MariBot(commands.Bot):
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        if event_name == "socket_event_type":
+            metricas.gateway[args[0]] += 1
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def setup_hook(self):
+        await metricas.iniciar()
+        vigia.iniciar()
+        flush_ledger.start()
+        flush_memoria_ia.start()
+        flush_uso_ia.start()
+        vips.iniciar()
+        conferir_economia.start()
+
+    async def close(self):
+        await super().close()
+        flush_ledger.stop()
+        await ledger.flush()
+        flush_memoria_ia.stop()
+        await memoria_ia.flush()
+        flush_uso_ia.stop()
+        await uso_ia.flush()
+        disjuntor_ia.parar()
+        await groq.close()
+        await metricas.parar()
+        vigia.parar()
+        lentos.parar()
+        # espera a fila do banco esvaziar sem travar o loop
+        await asyncio.to_thread(db.close)
+
+
+# sem o ~help padrão: a ajuda é o /help e, sem comandos de prefixo,
+# o on_message nem chama process_commands
+bot = MariBot(command_prefix="~", intents=intents, help_command=None, tree_cls=ArvoreMedida)
 
 START_TIME = time.time()
 BOT_VERSION = "v5.1.0 PUBLIC PREMIUM"
@@ -42,12 +349,144 @@ TESOURO_COOLDOWN = 6 * 60 * 60  # 6 horas
 # 🔹 DATABASE (SQLITE)
 # ===============================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "bot.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "bot.db"))
+DB_READERS = int(os.getenv("DB_READERS", "4"))  # 0 = leituras na thread de escrita
+
+
+class Database:
+    # Toda a I/O do SQLite roda fora do loop do asyncio: escritas numa
+    # thread dedicada (única conexão de escrita) e leituras num pool de
+    # conexões read-only. Com WAL, leitores não esperam commits.
+    def __init__(self, path: str, readers: int = DB_READERS):
+        self.path = path
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._worker, name="db-writer", daemon=True
+        )
+        self._thread.start()
+
+        self._leitores = []
+        self._local = threading.local()
+        self._pool = None
+        if readers > 0:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=readers,
+                thread_name_prefix="db-reader",
+                initializer=self._abrir_leitor
+            )
+
+    def _worker(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        while True:
+            job = self._fila.get()
+            if job is None:
+                break
 
-db = sqlite3.connect(DB_PATH, check_same_thread=False)
-cursor = db.cursor()
+            fn, fut = job
+            if not fut.set_running_or_notify_cancel():
+                continue
 
-cursor.execute("""
+            try:
+                result = fn(conn)
+                conn.commit()
+            except BaseException as e:
+                conn.rollback()
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+
+        conn.close()
+
+    def _abrir_leitor(self):
+        conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._local.conn = conn
+        self._leitores.append(conn)
+
+    def _ler(self, fn):
+        return fn(self._local.conn)
+
+    def _submit(self, fn) -> concurrent.futures.Future:
+        fut = concurrent.futures.Future()
+        self._fila.put((fn, fut))
+        return fut
+
+    # ---------- API assíncrona (handlers) ----------
+    async def run(self, fn):
+        # fn(conn) roda inteira numa única transação; um job já enfileirado
+        # não é descartado se a task que o aguarda for cancelada
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.shield(asyncio.wrap_future(self._submit(fn)))
+        finally:
+            perf.registrar("db.escrita", time.perf_counter() - t0)
+
+    async def transaction(self, fn):
+        # como run(), mas pega o lock de escrita já no início (BEGIN IMMEDIATE)
+        def job(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            return fn(conn)
+        return await self.run(job)
+
+    async def execute(self, sql: str, params=()) -> int:
+        return await self.run(lambda c: c.execute(sql, params).rowcount)
+
+    async def executemany(self, sql: str, seq) -> int:
+        return await self.run(lambda c: c.executemany(sql, seq).rowcount)
+
+    async def read(self, fn):
+        # fn(conn) só pode ler; roda numa conexão do pool
+        if self._pool is None:
+            return await self.run(fn)
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self._pool.submit(self._ler, fn))
+        finally:
+            perf.registrar("db.leitura", time.perf_counter() - t0)
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.read(lambda c: c.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.read(lambda c: c.execute(sql, params).fetchall())
+
+    async def fetchval(self, sql: str, params=(), default=None):
+        row = await self.fetchone(sql, params)
+        return row[0] if row else default
+
+    # ---------- API síncrona (import / shutdown, fora do loop) ----------
+    def run_sync(self, fn):
+        return self._submit(fn).result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            for conn in self._leitores:
+                conn.close()
+            self._leitores.clear()
+
+        if self._thread.is_alive():
+            self._fila.put(None)
+            self._thread.join()
+
+
+db = Database(DB_PATH)
+
+# ===============================
+# 🔹 MIGRAÇÕES DE SCHEMA
+# ===============================
+# Cada migração roda uma única vez, em ordem, dentro de uma transação
+# própria; a versão aplicada fica registrada em schema_version. Para
+# mudar o schema adicione uma nova entrada no fim da lista, nunca edite
+# uma migração que já foi para produção.
+MIGRATIONS = [
+    (1, "schema inicial", """
 CREATE TABLE IF NOT EXISTS users (
     user_id INTEGER PRIMARY KEY,
     coins INTEGER DEFAULT 0,
@@ -56,96 +495,304 @@ CREATE TABLE IF NOT EXISTS users (
     last_daily REAL DEFAULT 0,
     last_weekly REAL DEFAULT 0,
     last_work REAL DEFAULT 0
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS vip (
     user_id INTEGER PRIMARY KEY,
     nivel INTEGER,
     expires REAL
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS ia_memoria (
     user_id INTEGER,
     role TEXT,
     content TEXT
-)
-""")
+);
 
-db.commit()
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS investimentos (
     user_id INTEGER,
     valor INTEGER,
     timestamp REAL
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS modlog (
     guild_id INTEGER,
     channel_id INTEGER
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS ia_personalidade (
     user_id INTEGER PRIMARY KEY,
     prompt TEXT
-)
-""")
+);
 
-db.commit()
-# ===============================
-# 🔹 MODERAÇÃO / AUTOMATIZAÇÃO
-# ===============================
+-- MODERAÇÃO / AUTOMATIZAÇÃO
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS warns (
     user_id INTEGER,
     staff_id INTEGER,
     motivo TEXT,
     data REAL
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS auto_anuncios (
     guild_id INTEGER,
     channel_id INTEGER,
     mensagem TEXT,
     intervalo INTEGER
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS clans (
     clan_id INTEGER PRIMARY KEY AUTOINCREMENT,
     nome TEXT UNIQUE,
     lider_id INTEGER,
     xp INTEGER DEFAULT 0
-)
-""")
+);
 
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS clan_membros (
     clan_id INTEGER,
     user_id INTEGER
-)
-""")
+);
 
-db.commit()
-cursor.execute("""
 CREATE TABLE IF NOT EXISTS cacador (
     user_id INTEGER PRIMARY KEY,
     last_hunt REAL DEFAULT 0
-)
-""")
-db.commit()
+);
+
+-- RENDA PASSIVA: último lote do ledger gravado em users.coins
+
+CREATE TABLE IF NOT EXISTS ledger_seq (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER DEFAULT 0
+);
+
+INSERT OR IGNORE INTO ledger_seq (id, seq) VALUES (1, 0);
+
+-- CAÇA AO TESOURO
+
+CREATE TABLE IF NOT EXISTS tesouro (
+    etapa INTEGER DEFAULT 0,
+    vencedores INTEGER DEFAULT 0
+);
+
+INSERT OR IGNORE INTO tesouro (rowid) VALUES (1);
+"""),
+
+    (2, "índices de busca por usuário / guild", """
+CREATE INDEX IF NOT EXISTS idx_ia_memoria_user ON ia_memoria (user_id);
+CREATE INDEX IF NOT EXISTS idx_warns_user ON warns (user_id, data);
+CREATE INDEX IF NOT EXISTS idx_investimentos_user ON investimentos (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_auto_anuncios_guild ON auto_anuncios (guild_id);
+"""),
+
+    (3, "modlog com uma linha por guild", """
+CREATE TABLE modlog_new (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER
+);
+
+-- o REPLACE antigo só acrescentava linhas: fica a mais recente
+INSERT INTO modlog_new (guild_id, channel_id)
+SELECT guild_id, channel_id FROM modlog
+WHERE rowid IN (SELECT MAX(rowid) FROM modlog GROUP BY guild_id);
+
+DROP TABLE modlog;
+ALTER TABLE modlog_new RENAME TO modlog;
+"""),
+
+    (4, "clan_membros com chave (clan_id, user_id)", """
+CREATE TABLE clan_membros_new (
+    clan_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (clan_id, user_id)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO clan_membros_new (clan_id, user_id)
+SELECT clan_id, user_id FROM clan_membros
+WHERE clan_id IS NOT NULL AND user_id IS NOT NULL;
+
+DROP TABLE clan_membros;
+ALTER TABLE clan_membros_new RENAME TO clan_membros;
+
+CREATE INDEX IF NOT EXISTS idx_clan_membros_user ON clan_membros (user_id);
+"""),
+
+    (5, "coluna total indexada para os rankings", """
+ALTER TABLE users ADD COLUMN total INTEGER NOT NULL DEFAULT 0;
+UPDATE users SET total = coins + banco;
+
+CREATE INDEX idx_users_total ON users (total DESC, user_id);
+CREATE INDEX idx_users_xp ON users (xp DESC, user_id);
+
+CREATE TRIGGER trg_users_total_ins AFTER INSERT ON users
+BEGIN
+    UPDATE users SET total = NEW.coins + NEW.banco WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER trg_users_total_upd AFTER UPDATE OF coins, banco ON users
+BEGIN
+    UPDATE users SET total = NEW.coins + NEW.banco WHERE user_id = NEW.user_id;
+END;
+"""),
+
+    (6, "juros calculados por usuário (last_accrual)", """
+ALTER TABLE users ADD COLUMN last_accrual REAL NOT NULL DEFAULT 0;
+
+-- o UPDATE banco * 1.02 antigo deixava banco como REAL
+UPDATE users SET banco = CAST(banco AS INTEGER) WHERE typeof(banco) != 'integer';
+
+UPDATE users SET last_accrual = CAST(strftime('%s', 'now') AS REAL) WHERE banco > 0;
+"""),
+
+    (7, "agregados da economia mantidos por triggers", """
+CREATE TABLE economia_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    usuarios INTEGER NOT NULL DEFAULT 0,
+    coins INTEGER NOT NULL DEFAULT 0,
+    banco INTEGER NOT NULL DEFAULT 0,
+    xp INTEGER NOT NULL DEFAULT 0,
+    vip_1 INTEGER NOT NULL DEFAULT 0,
+    vip_2 INTEGER NOT NULL DEFAULT 0,
+    vip_3 INTEGER NOT NULL DEFAULT 0,
+    vip_4 INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO economia_stats (id, usuarios, coins, banco, xp)
+SELECT 1, COUNT(*), IFNULL(SUM(coins), 0), IFNULL(SUM(banco), 0), IFNULL(SUM(xp), 0)
+FROM users;
+
+UPDATE economia_stats SET
+    vip_1 = (SELECT COUNT(*) FROM vip WHERE nivel = 1),
+    vip_2 = (SELECT COUNT(*) FROM vip WHERE nivel = 2),
+    vip_3 = (SELECT COUNT(*) FROM vip WHERE nivel = 3),
+    vip_4 = (SELECT COUNT(*) FROM vip WHERE nivel = 4);
+
+CREATE TRIGGER trg_stats_users_ins AFTER INSERT ON users
+BEGIN
+    UPDATE economia_stats SET
+        usuarios = usuarios + 1,
+        coins = coins + NEW.coins,
+        banco = banco + NEW.banco,
+        xp = xp + NEW.xp
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_stats_users_upd AFTER UPDATE OF coins, banco, xp ON users
+BEGIN
+    UPDATE economia_stats SET
+        coins = coins + NEW.coins - OLD.coins,
+        banco = banco + NEW.banco - OLD.banco,
+        xp = xp + NEW.xp - OLD.xp
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_stats_users_del AFTER DELETE ON users
+BEGIN
+    UPDATE economia_stats SET
+        usuarios = usuarios - 1,
+        coins = coins - OLD.coins,
+        banco = banco - OLD.banco,
+        xp = xp - OLD.xp
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_stats_vip_ins AFTER INSERT ON vip
+BEGIN
+    UPDATE economia_stats SET
+        vip_1 = vip_1 + (NEW.nivel = 1),
+        vip_2 = vip_2 + (NEW.nivel = 2),
+        vip_3 = vip_3 + (NEW.nivel = 3),
+        vip_4 = vip_4 + (NEW.nivel = 4)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_stats_vip_upd AFTER UPDATE OF nivel ON vip
+BEGIN
+    UPDATE economia_stats SET
+        vip_1 = vip_1 + (NEW.nivel = 1) - (OLD.nivel = 1),
+        vip_2 = vip_2 + (NEW.nivel = 2) - (OLD.nivel = 2),
+        vip_3 = vip_3 + (NEW.nivel = 3) - (OLD.nivel = 3),
+        vip_4 = vip_4 + (NEW.nivel = 4) - (OLD.nivel = 4)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_stats_vip_del AFTER DELETE ON vip
+BEGIN
+    UPDATE economia_stats SET
+        vip_1 = vip_1 - (OLD.nivel = 1),
+        vip_2 = vip_2 - (OLD.nivel = 2),
+        vip_3 = vip_3 - (OLD.nivel = 3),
+        vip_4 = vip_4 - (OLD.nivel = 4)
+    WHERE id = 1;
+END;
+"""),
+    (8, "resumo contínuo da memória da IA", """
+CREATE TABLE IF NOT EXISTS ia_resumo (
+    user_id INTEGER PRIMARY KEY,
+    resumo TEXT NOT NULL
+);
+"""),
+    (9, "uso de tokens da IA por usuário e servidor", """
+CREATE TABLE IF NOT EXISTS ia_uso (
+    escopo TEXT NOT NULL,          -- 'u' usuário, 'g' servidor
+    alvo_id INTEGER NOT NULL,
+    dia INTEGER NOT NULL,          -- dias desde a epoch (UTC)
+    prompt INTEGER NOT NULL DEFAULT 0,
+    completion INTEGER NOT NULL DEFAULT 0,
+    chamadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (escopo, alvo_id, dia)
+) WITHOUT ROWID;
+"""),
+]
+
+
+def _statements(script: str) -> list:
+    # separa o script respeitando ; dentro de triggers e strings
+    stmts, atual = [], ""
+    for linha in script.splitlines(keepends=True):
+        atual += linha
+        if sqlite3.complete_statement(atual):
+            stmts.append(atual.strip())
+            atual = ""
+    if atual.strip():
+        stmts.append(atual.strip())
+    return stmts
+
+
+def migrar(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            nome TEXT,
+            applied_at REAL
+        )
+    """)
+    conn.commit()
+    atual = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+
+    for versao, nome, script in MIGRATIONS:
+        if versao <= atual:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in _statements(script):
+                conn.execute(sql)
+            conn.execute(
+                "INSERT INTO schema_version VALUES (?, ?, ?)",
+                (versao, nome, time.time())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
+        print(f"🗄️ Migração {versao} aplicada: {nome}")
+        atual = versao
+
+    return atual
+
+
+db.run_sync(migrar)
 
 # ===============================
 # 🔹 VIP CONFIG
@@ -165,65 +812,485 @@ VIP_MULTIPLIER = {
 }
 
 # ===============================
-# 🔹 ECONOMIA BASE (PixCoin)
+# 🔹 RENDA PASSIVA (WRITE-BEHIND)
+# ===============================
+LEDGER_INTERVALO = 5        # segundos entre flushes
+LEDGER_FLUSH_ENTRADAS = 2_000  # flush antecipado ao atingir N usuários
+LEDGER_MAX_ENTRADAS = 20_000   # acima disso quem credita espera o flush
+
+
+class Ledger:
+    # Acumula créditos de coins por usuário na memória e grava tudo num
+    # único executemany. Cada lote recebe um número de sequência que é
+    # gravado na mesma transação (ledger_seq), assim uma leitura sabe
+    # exatamente quais lotes já estão no valor vindo do banco.
+    def __init__(self):
+        self._pendente = {}
+        self._em_voo = {}  # seq -> lote sendo gravado
+        self._proximo = 1
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._pendente)
+
+    async def creditar(self, uid: int, valor: int):
+        if uid not in self._pendente and len(self._pendente) >= LEDGER_MAX_ENTRADAS:
+            # backpressure: o chamador só segue depois de liberar espaço
+            await self.flush()
+
+        self._pendente[uid] = self._pendente.get(uid, 0) + valor
+        perfis.conhecer(uid)
+
+        if len(self._pendente) >= LEDGER_FLUSH_ENTRADAS and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def retirar(self, uid: int) -> int:
+        # tira o crédito pendente para gravá-lo junto de outra transação
+        return self._pendente.pop(uid, 0)
+
+    def devolver(self, uid: int, valor: int):
+        if valor:
+            self._pendente[uid] = self._pendente.get(uid, 0) + valor
+
+    def snapshot(self, uid: int) -> list:
+        # (seq, delta) de tudo que ainda pode não estar no banco
+        parcelas = [(seq, lote.get(uid, 0)) for seq, lote in self._em_voo.items()]
+        parcelas.append((self._proximo, self._pendente.get(uid, 0)))
+        return parcelas
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pendente:
+                return
+
+            seq = self._proximo
+            self._proximo += 1
+            lote, self._pendente = self._pendente, {}
+            self._em_voo[seq] = lote
+
+            def gravar(conn):
+                conn.executemany(
+                    "INSERT INTO users (user_id, coins) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET coins = coins + excluded.coins",
+                    lote.items()
+                )
+                conn.execute("UPDATE ledger_seq SET seq=? WHERE id=1", (seq,))
+
+            def concluir(gravacao: asyncio.Task):
+                # roda quando a gravação termina de fato, mesmo que quem
+                # chamou flush() tenha sido cancelado (db.run é blindado)
+                del self._em_voo[seq]
+                if gravacao.cancelled() or gravacao.exception() is not None:
+                    # devolve o lote para a próxima rodada
+                    for uid, valor in lote.items():
+                        self._pendente[uid] = self._pendente.get(uid, 0) + valor
+                else:
+                    perfis.invalidar(*lote)
+
+            gravacao = asyncio.ensure_future(db.run(gravar))
+            gravacao.add_done_callback(concluir)
+            await asyncio.shield(gravacao)
+
+
+ledger = Ledger()
+
+
+@tasks.loop(seconds=LEDGER_INTERVALO)
+async def flush_ledger():
+    try:
+        await ledger.flush()
+    except Exception as e:
+        print("ERRO LEDGER:", e)
+
 # ===============================
-def get_user(uid: int):
-    cursor.execute(
-        "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
-        (uid,)
+# 🔹 PERFIL DO USUÁRIO (CACHE)
+# ===============================
+PERFIL_CACHE_MAX = int(os.getenv("PERFIL_CACHE_MAX", "50000"))
+COOLDOWNS = ("last_daily", "last_weekly", "last_work")
+
+
+class Profile:
+    __slots__ = (
+        "user_id", "coins", "banco", "xp",
+        "last_daily", "last_weekly", "last_work", "last_accrual", "seq"
     )
-    db.commit()
 
-def saldo(uid: int) -> int:
-    get_user(uid)
-    cursor.execute("SELECT coins FROM users WHERE user_id=?", (uid,))
-    return cursor.fetchone()[0]
+    def __init__(self, user_id, coins=0, banco=0, xp=0,
+                 last_daily=0, last_weekly=0, last_work=0,
+                 last_accrual=0, seq=0):
+        self.user_id = user_id
+        self.coins = coins
+        self.banco = banco
+        self.xp = xp
+        self.last_daily = last_daily
+        self.last_weekly = last_weekly
+        self.last_work = last_work
+        self.last_accrual = last_accrual
+        self.seq = seq  # lote do ledger já incluído em coins
+
+    @property
+    def vip(self) -> int:
+        return vip_level(self.user_id)
+
+    def efetivo(self, parcelas: list, agora: float) -> "Profile":
+        # aplica créditos pendentes do ledger e juros ainda não gravados
+        extra = sum(v for n, v in parcelas if n > self.seq)
+        banco_, desde = juros_acumulado(self.banco, self.last_accrual, agora)
+        if not extra and banco_ == self.banco:
+            return self
+        return Profile(
+            self.user_id, self.coins + extra, banco_, self.xp,
+            self.last_daily, self.last_weekly, self.last_work, desde, self.seq
+        )
+
+
+class ProfileCache:
+    # LRU de perfis lidos com uma única query. Toda escrita em users
+    # invalida o perfil afetado; o contador _epoch impede que uma leitura
+    # que começou antes da invalidação grave um perfil velho no cache.
+    # _conhecidos é um superconjunto dos user_id existentes: quem não está
+    # lá não tem linha no banco e recebe um perfil zerado sem query.
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._lru = collections.OrderedDict()
+        self._epoch = 0
+        self._conhecidos = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._conhecidos
+
+    def carregar(self):
+        rows = db.run_sync(lambda c: c.execute("SELECT user_id FROM users").fetchall())
+        self._conhecidos = {uid for (uid,) in rows}
+
+    def conhecer(self, uid: int):
+        # chamar ANTES de gravar uma linha nova
+        self._conhecidos.add(uid)
+
+    def invalidar(self, *uids):
+        self._epoch += 1
+        for uid in uids:
+            self._lru.pop(uid, None)
+
+    def limpar(self):
+        self._epoch += 1
+        self._lru.clear()
+
+    async def get(self, uid: int) -> Profile:
+        parcelas = ledger.snapshot(uid)
+        juros_ativos.add(uid)
+
+        perfil = self._lru.get(uid)
+        if perfil is not None:
+            self.hits += 1
+            self._lru.move_to_end(uid)
+            return perfil.efetivo(parcelas, time.time())
+
+        self.misses += 1
+        if uid not in self._conhecidos:
+            return Profile(uid).efetivo(parcelas, time.time())
+
+        epoch = self._epoch
+        row = await db.fetchone(
+            "SELECT u.coins, u.banco, u.xp, u.last_daily, u.last_weekly, u.last_work, "
+            "u.last_accrual, s.seq FROM ledger_seq s LEFT JOIN users u ON u.user_id=?",
+            (uid,)
+        )
+        coins, banco_, xp, daily, weekly, work, accrual, seq = row
+        perfil = Profile(
+            uid, coins or 0, banco_ or 0, xp or 0,
+            daily or 0, weekly or 0, work or 0, accrual or 0, seq
+        )
+
+        if epoch == self._epoch:
+            self._lru[uid] = perfil
+            if len(self._lru) > self.maximo:
+                self._lru.popitem(last=False)
 
-def banco(uid: int) -> int:
-    get_user(uid)
-    cursor.execute("SELECT banco FROM users WHERE user_id=?", (uid,))
-    return cursor.fetchone()[0]
+        return perfil.efetivo(parcelas, time.time())
 
-def add_saldo(uid: int, valor: int):
-    get_user(uid)
-    cursor.execute(
-        "UPDATE users SET coins = coins + ? WHERE user_id=?",
-        (valor, uid)
+
+perfis = ProfileCache(PERFIL_CACHE_MAX)
+perfis.carregar()
+
+
+async def get_profile(uid: int) -> Profile:
+    return await perfis.get(uid)
+
+# ===============================
+# 🔹 JUROS DO BANCO (LAZY)
+# ===============================
+# +2% a cada 30 minutos completos, contados por usuário a partir de
+# users.last_accrual. Leituras calculam o valor na hora; o juro só é
+# gravado quando o banco do usuário é alterado ou pela task `juros`,
+# que passa apenas por quem teve o saldo consultado/alterado. Por isso
+# users.total (ranking) e /economia só veem os juros já gravados.
+JUROS_PERIODO = 30 * 60
+JUROS_NUM, JUROS_DEN = 102, 100
+# teto do banco por juros: sem ele 45 dias parados passam de 2**63 e o
+# SQLite recusa o INTEGER; bem abaixo para as somas dos triggers caberem
+JUROS_TETO = 10**15
+
+juros_ativos = set()
+
+
+def juros_acumulado(banco: int, desde: float, agora: float):
+    # (banco com juros, novo last_accrual); aritmética inteira exata
+    if not desde:
+        return banco, desde
+    periodos = int((agora - desde) // JUROS_PERIODO)
+    if periodos <= 0:
+        return banco, desde
+    desde += periodos * JUROS_PERIODO
+    if banco <= 0 or banco >= JUROS_TETO:
+        return banco, desde
+    # já estoura o teto? evita a potência gigante de meses parados
+    if periodos * math.log(JUROS_NUM / JUROS_DEN) >= math.log(JUROS_TETO / banco):
+        return JUROS_TETO, desde
+    return min(JUROS_TETO, banco * JUROS_NUM ** periodos // JUROS_DEN ** periodos), desde
+
+
+def _acumular_juros(conn, uid: int, agora: float, criar: bool = True):
+    # grava os juros devidos; chamar dentro da transação, antes de mexer no banco
+    row = conn.execute(
+        "SELECT banco, last_accrual FROM users WHERE user_id=?", (uid,)
+    ).fetchone()
+    if row is None:
+        if not criar:
+            return
+        conn.execute(
+            "INSERT INTO users (user_id, last_accrual) VALUES (?, ?)", (uid, agora)
+        )
+        return
+
+    banco_, desde = row
+    if not desde:
+        conn.execute("UPDATE users SET last_accrual=? WHERE user_id=?", (agora, uid))
+        return
+
+    novo, desde_novo = juros_acumulado(banco_, desde, agora)
+    if desde_novo != desde:
+        conn.execute(
+            "UPDATE users SET banco=?, last_accrual=? WHERE user_id=?",
+            (novo, desde_novo, uid)
+        )
+
+# ===============================
+# 🔹 ECONOMIA BASE (PixCoin)
+# ===============================
+async def add_saldo(uid: int, valor: int):
+    perfis.conhecer(uid)
+    await db.execute(
+        "INSERT INTO users (user_id, coins) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET coins = coins + excluded.coins",
+        (uid, valor)
     )
-    db.commit()
+    perfis.invalidar(uid)
+
+class SaldoInsuficiente(Exception):
+    pass
+
+
+async def transacao(*pernas) -> bool:
+    # Executa todas as pernas (uid, "coins" | "banco", delta) numa única
+    # transação BEGIN IMMEDIATE, em ordem. Débitos são condicionais
+    # (WHERE coluna >= valor): se algum falhar nada é gravado e a função
+    # devolve False. Créditos pendentes no ledger de quem paga entram na
+    # mesma transação para contarem no saldo.
+    devedores = {uid for uid, coluna, delta in pernas if coluna == "coins" and delta < 0}
+    extras = {uid: ledger.retirar(uid) for uid in devedores}
+    bancos = {uid for uid, coluna, _ in pernas if coluna == "banco"}
+    agora = time.time()
+    loop = asyncio.get_running_loop()
+    for uid, _, _ in pernas:
+        perfis.conhecer(uid)
+
+    def devolver():
+        for uid, valor in extras.items():
+            ledger.devolver(uid, valor)
+
+    def job(conn):
+        try:
+            _pernas(conn)
+        except BaseException:
+            # rollback: os créditos retirados voltam ao ledger. Decidido aqui
+            # e não em quem aguarda, porque o job é blindado e segue (e pode
+            # gravar) mesmo se a task que o esperava for cancelada
+            loop.call_soon_threadsafe(devolver)
+            raise
+
+    def _pernas(conn):
+        for uid in bancos:
+            _acumular_juros(conn, uid, agora)
+
+        for uid, valor in extras.items():
+            if valor:
+                conn.execute(
+                    "INSERT INTO users (user_id, coins) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET coins = coins + excluded.coins",
+                    (uid, valor)
+                )
+
+        for uid, coluna, delta in pernas:
+            if delta == 0:
+                continue
+            if delta < 0:
+                cur = conn.execute(
+                    f"UPDATE users SET {coluna} = {coluna} + ? "
+                    f"WHERE user_id=? AND {coluna} >= ?",
+                    (delta, uid, -delta)
+                )
+                if cur.rowcount == 0:
+                    raise SaldoInsuficiente(uid)
+            else:
+                conn.execute(
+                    f"INSERT INTO users (user_id, {coluna}) VALUES (?, ?) "
+                    f"ON CONFLICT(user_id) DO UPDATE SET {coluna} = {coluna} + excluded.{coluna}",
+                    (uid, delta)
+                )
+
+    try:
+        await db.transaction(job)
+    except SaldoInsuficiente:
+        return False
+    finally:
+        perfis.invalidar(*(uid for uid, _, _ in pernas))
+
+    return True
 
-def add_banco(uid: int, valor: int):
-    get_user(uid)
-    cursor.execute(
-        "UPDATE users SET banco = banco + ? WHERE user_id=?",
-        (valor, uid)
+async def marcar_cooldown(uid: int, coluna: str, quando: float):
+    assert coluna in COOLDOWNS
+    perfis.conhecer(uid)
+    await db.execute(
+        f"INSERT INTO users (user_id, {coluna}) VALUES (?, ?) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {coluna} = excluded.{coluna}",
+        (uid, quando)
     )
-    db.commit()
+    perfis.invalidar(uid)
 
 # ===============================
 # 🔹 VIP FUNÇÕES
 # ===============================
-def is_vip(uid: int) -> bool:
-    cursor.execute("SELECT expires FROM vip WHERE user_id=?", (uid,))
-    row = cursor.fetchone()
-    if not row:
-        return False
+class VipCache:
+    # Estado VIP inteiro em memória: os caminhos quentes (on_message,
+    # economia) consultam só o dict. Expirações ficam num min-heap por
+    # timestamp e uma task acorda exatamente no próximo vencimento.
+    def __init__(self):
+        self._vips = {}   # uid -> (nivel, expires); expires -1 = permanente
+        self._heap = []   # (expires, uid), com entradas velhas ignoradas
+        self._mudou = asyncio.Event()
+        self._task = None
 
-    expires = row[0]
-    if expires == -1:
-        return True
+    def __len__(self):
+        return len(self._vips)
 
-    if time.time() > expires:
-        cursor.execute("DELETE FROM vip WHERE user_id=?", (uid,))
-        db.commit()
-        return False
+    def carregar(self):
+        rows = db.run_sync(
+            lambda c: c.execute("SELECT user_id, nivel, expires FROM vip").fetchall()
+        )
+        self._vips = {uid: (nivel, expires) for uid, nivel, expires in rows}
+        self._heap = [(exp, uid) for uid, (_, exp) in self._vips.items() if exp != -1]
+        heapq.heapify(self._heap)
+
+    def _cache(self, uid: int, nivel: int, expires: float):
+        self._vips[uid] = (nivel, expires)
+        if expires != -1:
+            heapq.heappush(self._heap, (expires, uid))
+            self._mudou.set()
+
+    def nivel(self, uid: int) -> int:
+        vip = self._vips.get(uid)
+        if not vip:
+            return 0
+        nivel, expires = vip
+        if expires != -1 and time.time() > expires:
+            return 0  # o varredor remove em instantes
+        return nivel
+
+    async def definir(self, uid: int, nivel: int, expires: float):
+        # upsert em vez de REPLACE: o REPLACE não dispara os triggers de DELETE
+        await db.execute(
+            "INSERT INTO vip (user_id, nivel, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET nivel=excluded.nivel, expires=excluded.expires",
+            (uid, nivel, expires)
+        )
+        self._cache(uid, nivel, expires)
+
+    async def transferir(self, de: int, para: int):
+        # tira do cache antes de qualquer await: dois cliques seguidos não
+        # conseguem transferir o mesmo VIP duas vezes
+        if not self.nivel(de):
+            return None
+        nivel, expires = self._vips.pop(de)
+
+        def job(conn):
+            conn.execute("DELETE FROM vip WHERE user_id=?", (de,))
+            conn.execute(
+                "INSERT INTO vip (user_id, nivel, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET nivel=excluded.nivel, expires=excluded.expires",
+                (para, nivel, expires)
+            )
 
-    return True
+        try:
+            await db.run(job)
+        except Exception:
+            self._vips[de] = (nivel, expires)
+            raise
+
+        self._cache(para, nivel, expires)
+        return nivel
+
+    def iniciar(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._varredor())
+
+    async def _varredor(self):
+        while True:
+            self._mudou.clear()
+            if not self._heap:
+                await self._mudou.wait()
+                continue
+
+            expires, uid = self._heap[0]
+            agora = time.time()
+            if expires > agora:
+                try:
+                    await asyncio.wait_for(self._mudou.wait(), expires - agora)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if self._vips.get(uid, (None, None))[1] != expires:
+                continue  # renovado, transferido ou já removido
+
+            del self._vips[uid]
+            try:
+                await db.execute(
+                    "DELETE FROM vip WHERE user_id=? AND expires=?",
+                    (uid, expires)
+                )
+            except Exception as e:
+                print("ERRO VIP:", e)
+
+
+vips = VipCache()
+vips.carregar()
+
+
+def is_vip(uid: int) -> bool:
+    return vips.nivel(uid) > 0
 
 def vip_level(uid: int) -> int:
-    cursor.execute("SELECT nivel FROM vip WHERE user_id=?", (uid,))
-    row = cursor.fetchone()
-    return row[0] if row else 0
+    return vips.nivel(uid)
 
 def vip_bonus(uid: int) -> float:
     return VIP_MULTIPLIER.get(vip_level(uid), 1.0)
@@ -236,22 +1303,64 @@ def can_create_server(uid: int) -> bool:
 # ===============================
 XP_PER_MESSAGE = 5
 
-def add_xp(uid: int, amount: int):
-    get_user(uid)
-    cursor.execute(
-        "UPDATE users SET xp = xp + ? WHERE user_id=?",
-        (amount, uid)
+async def add_xp(uid: int, amount: int):
+    perfis.conhecer(uid)
+    await db.execute(
+        "INSERT INTO users (user_id, xp) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET xp = xp + excluded.xp",
+        (uid, amount)
     )
-    db.commit()
+    perfis.invalidar(uid)
 
-def get_xp(uid: int) -> int:
-    get_user(uid)
-    cursor.execute("SELECT xp FROM users WHERE user_id=?", (uid,))
-    return cursor.fetchone()[0]
+async def get_xp(uid: int) -> int:
+    return (await get_profile(uid)).xp
 
 def calc_level(xp: int) -> int:
     return int((xp / 100) ** 0.5)
 
+# ===============================
+# 🔹 RANKINGS
+# ===============================
+RANKING_POR_PAGINA = 10
+
+
+class Leaderboard:
+    # Ranking servido pelos índices (coluna DESC, user_id): uma página é
+    # uma caminhada curta no índice e a posição de um usuário é uma
+    # contagem no índice coberto, sem ler nem ordenar a tabela users.
+    def __init__(self, coluna: str):
+        self.coluna = coluna
+
+    async def pagina(self, n: int) -> list:
+        return await db.fetchall(
+            f"SELECT user_id, {self.coluna} FROM users "
+            f"ORDER BY {self.coluna} DESC, user_id LIMIT ? OFFSET ?",
+            (RANKING_POR_PAGINA, (n - 1) * RANKING_POR_PAGINA)
+        )
+
+    async def posicao(self, uid: int):
+        # (posição, valor) ou None se o usuário não existe
+        def job(conn):
+            row = conn.execute(
+                f"SELECT {self.coluna} FROM users WHERE user_id=?", (uid,)
+            ).fetchone()
+            if not row:
+                return None
+
+            valor = row[0]
+            acima = conn.execute(
+                f"SELECT (SELECT COUNT(*) FROM users WHERE {self.coluna} > ?)"
+                f" + (SELECT COUNT(*) FROM users WHERE {self.coluna} = ? AND user_id < ?)",
+                (valor, valor, uid)
+            ).fetchone()[0]
+            return acima + 1, valor
+
+        return await db.read(job)
+
+
+ranking_pix = Leaderboard("total")
+ranking_lvl = Leaderboard("xp")
+
 # ===============================
 # 🔹 IA GROQ (CORRIGIDA)
 # ===============================
@@ -262,42 +1371,827 @@ SYSTEM_PROMPT = (
     "Sempre responda em português.\n"
 )
 
-async def ask_groq(uid: int, text: str) -> str:
-    cursor.execute(
-        "SELECT role, content FROM ia_memoria WHERE user_id=? ORDER BY rowid DESC LIMIT 6",
-        (uid,)
+IA_MODELO = "llama-3.1-8b-instant"
+IA_MAX_CONCORRENTES = int(os.getenv("IA_MAX_CONCORRENTES", "8"))  # chamadas simultâneas
+IA_MAX_POR_USUARIO = int(os.getenv("IA_MAX_POR_USUARIO", "1"))
+IA_FILA_MAX = int(os.getenv("IA_FILA_MAX", "32"))                 # esperando vaga
+IA_ESPERA_MAX = float(os.getenv("IA_ESPERA_MAX", "15"))           # segundos na fila
+IA_TIMEOUT = float(os.getenv("IA_TIMEOUT", "30"))                 # por requisição
+IA_STREAMING = os.getenv("IA_STREAMING", "1") == "1"
+IA_EDICAO_INTERVALO = float(os.getenv("IA_EDICAO_INTERVALO", "1.2"))  # entre edits
+IA_DEBOUNCE = float(os.getenv("IA_DEBOUNCE", "1.0"))  # janela para juntar rajadas
+IA_CACHE_TTL = float(os.getenv("IA_CACHE_TTL", "600"))
+IA_CACHE_MAX_BYTES = int(os.getenv("IA_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+IA_MEMORIA_TAMANHO = 6                                               # mensagens por usuário
+IA_MEMORIA_MAX_USUARIOS = int(os.getenv("IA_MEMORIA_MAX_USUARIOS", "20000"))
+IA_MEMORIA_INTERVALO = 10                                            # segundos entre flushes
+IA_CONTEXTO_TOKENS = int(os.getenv("IA_CONTEXTO_TOKENS", "1200"))    # orçamento do prompt
+IA_RESUMO_TOKENS = int(os.getenv("IA_RESUMO_TOKENS", "200"))         # reservado ao resumo
+IA_RESUMO_TRECHO = 140                                               # chars por turno resumido
+IA_PERSONALIDADE_MAX = 500                                           # chars
+IA_COTA_GUILD = int(os.getenv("IA_COTA_GUILD", "300000"))            # tokens/dia, 0 = sem limite
+IA_USO_INTERVALO = 30                                                # segundos entre flushes
+IA_DISJUNTOR_JANELA = 60       # segundos de histórico considerados
+IA_DISJUNTOR_MINIMO = 5        # chamadas na janela antes de poder abrir
+IA_DISJUNTOR_FALHAS = 0.5      # fração de falhas que abre o disjuntor
+IA_DISJUNTOR_LENTO = 12.0      # segundos: chamada mais lenta conta como falha
+IA_DISJUNTOR_PAUSA = 15.0      # aberto antes da 1ª sonda; dobra a cada sonda falha
+IA_DISJUNTOR_PAUSA_MAX = 120.0
+
+# tokens por dia por nível VIP (0 = sem VIP)
+IA_COTA_DIARIA = {
+    0: 15_000,
+    1: 30_000,
+    2: 60_000,
+    3: 150_000,
+    4: 400_000
+}
+
+
+def estimar_tokens(texto: str) -> int:
+    # ~3 chars por token em português + overhead da mensagem no chat template
+    return len(texto) // 3 + 4
+
+
+def compactar_resumo(resumo: str, turnos, limite: int) -> str:
+    # resumo contínuo: uma linha curta por turno, descartando as mais
+    # antigas até caber em `limite` tokens
+    linhas = resumo.splitlines() if resumo else []
+    for role, content in turnos:
+        trecho = " ".join(content.split())
+        if len(trecho) > IA_RESUMO_TRECHO:
+            trecho = trecho[:IA_RESUMO_TRECHO - 1] + "…"
+        linhas.append(f"{'Usuário' if role == 'user' else 'Mari'}: {trecho}")
+
+    total = 0
+    inicio = len(linhas)
+    while inicio > 0:
+        custo = estimar_tokens(linhas[inicio - 1])
+        if total + custo > limite:
+            break
+        total += custo
+        inicio -= 1
+    return "\n".join(linhas[inicio:])
+
+# Cliente assíncrono com pool keep-alive compartilhado: uma resposta lenta
+# só ocupa uma vaga, nunca o loop (heartbeat e slash commands seguem).
+groq = AsyncGroq(
+    api_key=GROQ_API_KEY,
+    base_url=GROQ_BASE_URL,
+    timeout=IA_TIMEOUT,
+    max_retries=1,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=IA_MAX_CONCORRENTES,
+            max_keepalive_connections=IA_MAX_CONCORRENTES,
+            keepalive_expiry=60
+        )
     )
-    memoria = cursor.fetchall()[::-1]
+)
 
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    for role, content in memoria:
-        messages.append({"role": role, "content": content})
 
-    messages.append({"role": "user", "content": text})
+class IAOcupada(Exception):
+    pass
+
+
+class IACota(Exception):
+    pass
+
+
+class IAIndisponivel(Exception):
+    pass
+
+
+class Disjuntor:
+    # Circuit breaker da Groq. Fechado: tudo passa e cada chamada entra na
+    # janela (falha = erro de conexão/timeout, 429, 5xx ou lentidão).
+    # Falhas demais abrem o disjuntor: pedidos recusam na hora e uma sonda
+    # em background (meio aberto) testa a API com backoff até voltar.
+    def __init__(self):
+        self.estado = "fechado"
+        self._janela = collections.deque()  # (monotonic, ok)
+        self._latencias = collections.deque(maxlen=200)
+        self._sonda = None
+        self.pausa = IA_DISJUNTOR_PAUSA
+        self.desde = time.time()
+        self.aberturas = 0
+        self.recusadas = 0
+        self.erros = collections.Counter()  # tipo da exceção -> quantas
+        self.ultimo_erro = None  # (timestamp, descrição)
+
+    def permitir(self) -> bool:
+        if self.estado == "fechado":
+            return True
+        self.recusadas += 1
+        return False
+
+    @staticmethod
+    def falha_do_provedor(e: Exception) -> bool:
+        if isinstance(e, APIConnectionError):
+            return True
+        return isinstance(e, APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+    def _podar(self, agora: float):
+        while self._janela and agora - self._janela[0][0] > IA_DISJUNTOR_JANELA:
+            self._janela.popleft()
+
+    def falhas(self) -> tuple:
+        self._podar(time.monotonic())
+        return sum(1 for _, ok in self._janela if not ok), len(self._janela)
+
+    def registrar(self, duracao: float, erro=None):
+        agora = time.monotonic()
+        if erro is None:
+            self._latencias.append(duracao)
+            if duracao > IA_DISJUNTOR_LENTO:
+                erro = f"lenta ({duracao:.1f}s)"
+        if erro is not None:
+            self.ultimo_erro = (time.time(), str(erro)[:200])
+
+        self._janela.append((agora, erro is None))
+        self._podar(agora)
+
+        falhas, total = self.falhas()
+        if (
+            self.estado == "fechado"
+            and total >= IA_DISJUNTOR_MINIMO
+            and falhas / total >= IA_DISJUNTOR_FALHAS
+        ):
+            self._abrir()
+
+    def _abrir(self):
+        self.estado = "aberto"
+        self.desde = time.time()
+        self.aberturas += 1
+        print(f"⚠️ Disjuntor da IA aberto: {self.ultimo_erro[1] if self.ultimo_erro else '?'}")
+        self._sonda = asyncio.create_task(self._sondar())
+
+    async def _sondar(self):
+        while True:
+            await asyncio.sleep(self.pausa)
+            self.estado = "meio_aberto"
+            t0 = time.monotonic()
+            try:
+                await groq.chat.completions.create(
+                    model=IA_MODELO,
+                    messages=[{"role": "user", "content": "ping"}],
+                    max_tokens=1,
+                    timeout=IA_DISJUNTOR_LENTO
+                )
+                ok = True
+            except Exception as e:
+                self.ultimo_erro = (time.time(), f"sonda: {str(e)[:180]}")
+                ok = False
+
+            if ok and time.monotonic() - t0 <= IA_DISJUNTOR_LENTO:
+                self.estado = "fechado"
+                self.desde = time.time()
+                self.pausa = IA_DISJUNTOR_PAUSA
+                self._janela.clear()
+                print("✅ Disjuntor da IA fechado")
+                return
+
+            self.estado = "aberto"
+            self.pausa = min(self.pausa * 2, IA_DISJUNTOR_PAUSA_MAX)
+
+    def latencia(self, p: float) -> float:
+        if not self._latencias:
+            return 0.0
+        ordenadas = sorted(self._latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+    def parar(self):
+        if self._sonda:
+            self._sonda.cancel()
+
+
+disjuntor_ia = Disjuntor()
+
+
+class LimitadorIA:
+    # Teto global de chamadas em voo, teto por usuário e fila de espera
+    # limitada: quando lota, recusa na hora em vez de acumular tasks.
+    # A fila é um heap por prioridade (nível VIP) e, no empate, por ordem
+    # de chegada: vaga liberada vai direto para o primeiro do heap.
+    def __init__(self, maximo: int, por_usuario: int, fila_max: int, espera_max: float):
+        self._livres = maximo
+        self._fila = []  # (-prioridade, ordem, future); futures canceladas ficam até sair
+        self._ordem = itertools.count()
+        self._por_usuario = por_usuario
+        self._fila_max = fila_max
+        self._espera_max = espera_max
+        self._usuarios = {}  # uid -> chamadas em voo ou esperando
+        self.esperando = 0
+
+    def _liberar(self):
+        while self._fila:
+            _, _, fut = heapq.heappop(self._fila)
+            if not fut.done():
+                fut.set_result(None)  # a vaga passa direto para quem esperava
+                return
+        self._livres += 1
+
+    async def _adquirir(self, prioridade: int):
+        if self._livres and not self.esperando:
+            self._livres -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._fila, (-prioridade, next(self._ordem), fut))
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self._espera_max)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self._liberar()  # ganhou a vaga junto com o timeout
+            else:
+                fut.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise IAOcupada("espera") from None
+            raise
+        finally:
+            self.esperando -= 1
+
+    @contextlib.asynccontextmanager
+    async def vaga(self, uid: int, prioridade: int = 0):
+        if self._usuarios.get(uid, 0) >= self._por_usuario:
+            raise IAOcupada("usuario")
+        if not self._livres and self.esperando >= self._fila_max:
+            raise IAOcupada("fila")
+
+        self._usuarios[uid] = self._usuarios.get(uid, 0) + 1
+        try:
+            await self._adquirir(prioridade)
+            try:
+                yield
+            finally:
+                self._liberar()
+        finally:
+            restantes = self._usuarios[uid] - 1
+            if restantes:
+                self._usuarios[uid] = restantes
+            else:
+                del self._usuarios[uid]
+
+
+limitador_ia = LimitadorIA(IA_MAX_CONCORRENTES, IA_MAX_POR_USUARIO, IA_FILA_MAX, IA_ESPERA_MAX)
+
+
+class CacheRespostas:
+    # LRU + TTL de respostas, limitado em bytes. A chave cobre o prompt de
+    # sistema, a janela de memória e a mensagem normalizada: o mesmo "Oi!"
+    # com o mesmo contexto (ex.: usuários novos) reaproveita a resposta.
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lru = collections.OrderedDict()  # chave -> (expira, resposta)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    @staticmethod
+    def chave(messages: list) -> bytes:
+        *contexto, pergunta = messages
+        normalizada = " ".join(pergunta["content"].casefold().split())
+        bruto = json.dumps([contexto, normalizada], ensure_ascii=False)
+        return hashlib.blake2b(bruto.encode(), digest_size=16).digest()
+
+    @staticmethod
+    def _tamanho(resposta: str) -> int:
+        return len(resposta.encode()) + 64  # + chave e tupla
+
+    def get(self, chave: bytes):
+        item = self._lru.get(chave)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                self._remover(chave)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._lru.move_to_end(chave)
+        return item[1]
+
+    def guardar(self, chave: bytes, resposta: str):
+        if not resposta or self._tamanho(resposta) > self.max_bytes:
+            return
+        if chave in self._lru:
+            self._remover(chave)
+        self._lru[chave] = (time.monotonic() + self.ttl, resposta)
+        self.bytes += self._tamanho(resposta)
+        while self.bytes > self.max_bytes:
+            self._remover(next(iter(self._lru)))
+
+    def _remover(self, chave: bytes):
+        _, resposta = self._lru.pop(chave)
+        self.bytes -= self._tamanho(resposta)
+
+
+cache_ia = CacheRespostas(IA_CACHE_TTL, IA_CACHE_MAX_BYTES)
+
+
+def _dia() -> int:
+    return int(time.time() // 86400)
+
+
+class UsoIA:
+    # Tokens gastos hoje por usuário ('u') e servidor ('g') em memória,
+    # para a checagem de cota não tocar no banco; os deltas vão em lote
+    # para ia_uso (upsert somando).
+    def __init__(self):
+        self.dia = _dia()
+        self._hoje = collections.Counter()  # (escopo, id) -> tokens hoje
+        self._pendente = {}                 # (escopo, id, dia) -> [prompt, completion, chamadas]
+
+    def carregar(self):
+        rows = db.run_sync(lambda c: c.execute(
+            "SELECT escopo, alvo_id, prompt + completion FROM ia_uso WHERE dia=?",
+            (self.dia,)
+        ).fetchall())
+        self._hoje = collections.Counter({(esc, alvo): total for esc, alvo, total in rows})
+
+    def _virar_dia(self):
+        hoje = _dia()
+        if hoje != self.dia:
+            self.dia = hoje
+            self._hoje.clear()
+
+    def gasto(self, escopo: str, alvo: int) -> int:
+        self._virar_dia()
+        return self._hoje[(escopo, alvo)]
+
+    def cota(self, uid: int) -> int:
+        return IA_COTA_DIARIA[vip_level(uid)]
+
+    def estourou(self, uid: int, guild_id=None):
+        if self.gasto("u", uid) >= self.cota(uid):
+            return "usuario"
+        if guild_id and IA_COTA_GUILD and self.gasto("g", guild_id) >= IA_COTA_GUILD:
+            return "servidor"
+        return None
+
+    def registrar(self, uid: int, guild_id, prompt: int, completion: int):
+        self._virar_dia()
+        alvos = [("u", uid)] + ([("g", guild_id)] if guild_id else [])
+        for escopo, alvo in alvos:
+            self._hoje[(escopo, alvo)] += prompt + completion
+            p = self._pendente.setdefault((escopo, alvo, self.dia), [0, 0, 0])
+            p[0] += prompt
+            p[1] += completion
+            p[2] += 1
+
+    async def flush(self):
+        if not self._pendente:
+            return
+        lote, self._pendente = self._pendente, {}
+
+        try:
+            await db.executemany(
+                "INSERT INTO ia_uso (escopo, alvo_id, dia, prompt, completion, chamadas) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(escopo, alvo_id, dia) DO UPDATE SET "
+                "prompt = prompt + excluded.prompt, "
+                "completion = completion + excluded.completion, "
+                "chamadas = chamadas + excluded.chamadas",
+                [(*chave, *valores) for chave, valores in lote.items()]
+            )
+        except Exception:
+            # cancelar quem aguarda não cancela o executemany (blindado),
+            # então só devolve o lote quando a gravação falhou de fato
+            for chave, valores in lote.items():
+                p = self._pendente.setdefault(chave, [0, 0, 0])
+                for k in range(3):
+                    p[k] += valores[k]
+            raise
+
+
+uso_ia = UsoIA()
+uso_ia.carregar()
+
 
-    res = groq.chat.completions.create(
-        model="llama-3.1-8b-instant",
+@tasks.loop(seconds=IA_USO_INTERVALO)
+async def flush_uso_ia():
+    try:
+        await uso_ia.flush()
+    except Exception as e:
+        print("ERRO USO IA:", e)
+
+
+async def ask_groq(uid: int, text: str, ao_parcial=None, guild_id=None) -> str:
+    # ao_parcial(texto) liga o streaming: recebe o texto acumulado a cada token
+    with perf.medir("ia.ask_groq"):
+        return await _ask_groq(uid, text, ao_parcial, guild_id)
+
+
+async def _ask_groq(uid: int, text: str, ao_parcial, guild_id) -> str:
+    with perf.medir("ia.contexto"):
+        messages = await _montar_contexto(uid, text)
+
+    chave = cache_ia.chave(messages)
+    reply = cache_ia.get(chave)
+    if reply is None:
+        # resposta do cache não gasta cota
+        motivo = uso_ia.estourou(uid, guild_id)
+        if motivo:
+            raise IACota(motivo)
+        if not disjuntor_ia.permitir():
+            raise IAIndisponivel()
+
+        t0 = time.monotonic()
+        async with limitador_ia.vaga(uid, vip_level(uid)):
+            perf.registrar("ia.fila", time.monotonic() - t0)
+            # pode ter aberto enquanto esperava na fila
+            if not disjuntor_ia.permitir():
+                raise IAIndisponivel()
+
+            t0 = time.monotonic()
+            try:
+                reply, uso = await _completar(messages, ao_parcial)
+            except Exception as e:
+                disjuntor_ia.erros[type(e).__name__] += 1
+                if disjuntor_ia.falha_do_provedor(e):
+                    disjuntor_ia.registrar(time.monotonic() - t0, e)
+                raise
+            disjuntor_ia.registrar(time.monotonic() - t0)
+            perf.registrar("ia.groq", time.monotonic() - t0)
+        cache_ia.guardar(chave, reply)
+
+        if uso:
+            uso_ia.registrar(uid, guild_id, uso.prompt_tokens, uso.completion_tokens)
+        else:
+            uso_ia.registrar(
+                uid, guild_id,
+                sum(estimar_tokens(m["content"]) for m in messages), estimar_tokens(reply)
+            )
+
+    # resposta do cache também entra na memória da conversa
+    await memoria_ia.adicionar(uid, ("user", text), ("assistant", reply))
+    return reply
+
+
+async def _completar(messages: list, ao_parcial=None) -> tuple:
+    # (texto, usage); usage pode vir None de provedores que não mandam
+    if ao_parcial is None:
+        res = await groq.chat.completions.create(
+            model=IA_MODELO,
+            messages=messages,
+            temperature=0.8,
+            max_tokens=250
+        )
+        return res.choices[0].message.content, res.usage
+
+    ao_parcial("")
+    stream = await groq.chat.completions.create(
+        model=IA_MODELO,
         messages=messages,
         temperature=0.8,
-        max_tokens=250
+        max_tokens=250,
+        stream=True
+    )
+
+    partes = []
+    uso = None
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            partes.append(chunk.choices[0].delta.content)
+            ao_parcial("".join(partes))
+        # a Groq manda o usage no último chunk, dentro de x_groq
+        if chunk.x_groq and chunk.x_groq.usage:
+            uso = chunk.x_groq.usage
+        elif chunk.usage:
+            uso = chunk.usage
+    return "".join(partes), uso
+
+
+class MemoriaIA:
+    # Janela de conversa por usuário num deque de tamanho fixo: o corte das
+    # mensagens antigas acontece em memória. Cada usuário é lido do banco
+    # uma vez (sob demanda) e os alterados são regravados em lote pelo
+    # flush, trocando as linhas dele de uma vez pelo índice de user_id.
+    # O que sai do deque é dobrado no resumo contínuo do usuário.
+    def __init__(self, tamanho: int, maximo: int):
+        self.tamanho = tamanho
+        self.maximo = maximo
+        self._buffers = collections.OrderedDict()  # uid -> deque[(role, content)]
+        self._resumos = {}                         # uid -> resumo
+        self._sujos = set()
+        self._em_voo = set()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    async def _buffer(self, uid: int) -> collections.deque:
+        buf = self._buffers.get(uid)
+        if buf is not None:
+            self._buffers.move_to_end(uid)
+            return buf
+
+        def job(conn):
+            rows = conn.execute(
+                "SELECT role, content FROM ia_memoria WHERE user_id=? ORDER BY rowid DESC LIMIT ?",
+                (uid, self.tamanho)
+            ).fetchall()
+            resumo = conn.execute(
+                "SELECT resumo FROM ia_resumo WHERE user_id=?", (uid,)
+            ).fetchone()
+            return rows, resumo[0] if resumo else ""
+
+        rows, resumo = await db.read(job)
+        # outra coroutine pode ter carregado enquanto a leitura rodava
+        buf = self._buffers.get(uid)
+        if buf is None:
+            buf = collections.deque(reversed(rows), maxlen=self.tamanho)
+            self._buffers[uid] = buf
+            self._resumos[uid] = resumo
+            self._despejar()
+        return buf
+
+    def _despejar(self):
+        # só sai do cache quem já está gravado no banco (e nunca o recém-lido)
+        excesso = len(self._buffers) - self.maximo
+        if excesso <= 0:
+            return
+        for uid in list(self._buffers)[:-1]:
+            if uid not in self._sujos and uid not in self._em_voo:
+                del self._buffers[uid]
+                del self._resumos[uid]
+                excesso -= 1
+                if not excesso:
+                    break
+
+    async def janela(self, uid: int) -> tuple:
+        # (resumo, mensagens recentes em ordem)
+        buf = await self._buffer(uid)
+        return self._resumos[uid], list(buf)
+
+    async def adicionar(self, uid: int, *mensagens):
+        buf = await self._buffer(uid)
+        saindo = max(0, len(buf) + len(mensagens) - self.tamanho)
+        if saindo:
+            self._resumos[uid] = compactar_resumo(
+                self._resumos[uid], list(buf)[:saindo], IA_RESUMO_TOKENS
+            )
+        buf.extend(mensagens)
+        self._sujos.add(uid)
+
+    async def flush(self):
+        if not self._sujos:
+            return
+
+        lote = {uid: (list(self._buffers[uid]), self._resumos[uid]) for uid in self._sujos}
+        self._sujos = set()
+        self._em_voo.update(lote)
+
+        def job(conn):
+            for uid, (itens, resumo) in lote.items():
+                conn.execute("DELETE FROM ia_memoria WHERE user_id=?", (uid,))
+                conn.executemany(
+                    "INSERT INTO ia_memoria (user_id, role, content) VALUES (?, ?, ?)",
+                    [(uid, role, content) for role, content in itens]
+                )
+                if resumo:
+                    conn.execute(
+                        "INSERT INTO ia_resumo (user_id, resumo) VALUES (?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET resumo=excluded.resumo",
+                        (uid, resumo)
+                    )
+
+        try:
+            await db.transaction(job)
+        except BaseException:
+            self._sujos.update(lote)
+            raise
+        finally:
+            self._em_voo.difference_update(lote)
+
+
+memoria_ia = MemoriaIA(IA_MEMORIA_TAMANHO, IA_MEMORIA_MAX_USUARIOS)
+
+
+@tasks.loop(seconds=IA_MEMORIA_INTERVALO)
+async def flush_memoria_ia():
+    try:
+        await memoria_ia.flush()
+    except Exception as e:
+        print("ERRO MEMORIA IA:", e)
+
+
+class Personalidades:
+    # Prompts de /ia_personalidade em memória (tabela pequena, lida no
+    # boot). O prefixo de sistema montado é reaproveitado entre chamadas.
+    def __init__(self):
+        self._prompts = {}  # uid -> personalidade
+        self._prefixos = {}  # personalidade -> prompt de sistema
+
+    def carregar(self):
+        rows = db.run_sync(
+            lambda c: c.execute("SELECT user_id, prompt FROM ia_personalidade").fetchall()
+        )
+        self._prompts = {uid: prompt for uid, prompt in rows if prompt}
+
+    async def definir(self, uid: int, prompt: str):
+        prompt = prompt.strip()[:IA_PERSONALIDADE_MAX]
+        await db.execute("REPLACE INTO ia_personalidade VALUES (?, ?)", (uid, prompt))
+        self._prompts[uid] = prompt
+
+    def prefixo(self, uid: int) -> str:
+        prompt = self._prompts.get(uid)
+        if not prompt:
+            return SYSTEM_PROMPT
+        prefixo = self._prefixos.get(prompt)
+        if prefixo is None:
+            if len(self._prefixos) >= 1024:
+                self._prefixos.clear()
+            prefixo = self._prefixos[prompt] = (
+                f"{SYSTEM_PROMPT}Personalidade pedida pelo usuário: {prompt}\n"
+            )
+        return prefixo
+
+
+personalidades = Personalidades()
+personalidades.carregar()
+
+
+async def _montar_contexto(uid: int, text: str) -> list:
+    # cabe em IA_CONTEXTO_TOKENS: sistema + resumo + o máximo de mensagens
+    # recentes; as que não cabem entram (encurtadas) no resumo
+    resumo, memoria = await memoria_ia.janela(uid)
+    sistema = personalidades.prefixo(uid)
+
+    orcamento = (
+        IA_CONTEXTO_TOKENS - IA_RESUMO_TOKENS
+        - estimar_tokens(sistema) - estimar_tokens(text)
     )
+    recentes = 0
+    for _, content in reversed(memoria):
+        custo = estimar_tokens(content)
+        if custo > orcamento:
+            break
+        orcamento -= custo
+        recentes += 1
+
+    fora = memoria[:len(memoria) - recentes]
+    if fora:
+        resumo = compactar_resumo(resumo, fora, IA_RESUMO_TOKENS)
+    if resumo:
+        sistema = f"{sistema}\nResumo da conversa até aqui:\n{resumo}\n"
+
+    messages = [{"role": "system", "content": sistema}]
+    for role, content in memoria[len(fora):]:
+        messages.append({"role": role, "content": content})
 
-    reply = res.choices[0].message.content
+    messages.append({"role": "user", "content": text})
+    return messages
+
+
+class RespostaProgressiva:
+    # Placeholder postado assim que a chamada ganha vaga e editado em
+    # pedaços conforme os tokens chegam, no máximo um edit por intervalo
+    # (o Discord limita edições por canal).
+    def __init__(self, origem: discord.Message):
+        self._origem = origem
+        self._msg = None      # task do reply com o placeholder
+        self._texto = ""
+        self._enviado = ""
+        self._ultima = 0.0
+        self._edicao = None
+
+    def atualizar(self, texto: str):
+        # chamado a cada token: só agenda, nunca segura o stream
+        self._texto = texto
+        if self._msg is None:
+            self._msg = asyncio.create_task(self._origem.reply("💭 ..."))
+            return
+        if self._edicao and not self._edicao.done():
+            return
+        if time.monotonic() - self._ultima >= IA_EDICAO_INTERVALO:
+            self._ultima = time.monotonic()
+            self._edicao = asyncio.create_task(self._editar())
+
+    async def _editar(self):
+        try:
+            msg = await self._msg
+            texto = self._texto
+            if texto and texto != self._enviado:
+                await msg.edit(content=texto[:1990] + " ▌")
+                self._enviado = texto
+        except Exception as e:
+            print("ERRO IA EDIT:", e)
+
+    async def finalizar(self, texto: str):
+        texto = texto[:2000] or "💜"
+        if self._msg is None:
+            await self._origem.reply(texto)
+            return
+        if self._edicao:
+            await self._edicao
+        try:
+            msg = await self._msg
+        except Exception as e:
+            # o placeholder não saiu (HTTP, permissão, canal...): responde direto
+            print("ERRO IA EDIT:", e)
+            await self._origem.reply(texto)
+            return
+        await msg.edit(content=texto)
+
+    async def descartar(self):
+        # resposta substituída por uma rajada maior: some com o placeholder
+        if self._msg is None:
+            return
+        try:
+            if self._edicao:
+                await self._edicao
+            msg = await self._msg
+            await msg.delete()
+        except Exception as e:
+            print("ERRO IA EDIT:", e)
 
-    cursor.execute("INSERT INTO ia_memoria VALUES (?, ?, ?)", (uid, "user", text))
-    cursor.execute("INSERT INTO ia_memoria VALUES (?, ?, ?)", (uid, "assistant", reply))
 
-    cursor.execute("""
-        DELETE FROM ia_memoria
-        WHERE rowid NOT IN (
-            SELECT rowid FROM ia_memoria
-            WHERE user_id=?
-            ORDER BY rowid DESC LIMIT 6
-        ) AND user_id=?
-    """, (uid, uid))
+async def responder_ia(message: discord.Message, content: str):
+    resposta = RespostaProgressiva(message)
+    try:
+        reply = await ask_groq(
+            message.author.id, content,
+            ao_parcial=resposta.atualizar if IA_STREAMING else None,
+            guild_id=message.guild.id if message.guild else None
+        )
+        # já está na memória: mensagens novas abrem outra rajada
+        agrupador_ia.fechar(message)
+        with perf.medir("discord.resposta"):
+            await resposta.finalizar(reply)
+
+    except asyncio.CancelledError:
+        await resposta.descartar()
+        raise
+
+    except IAOcupada as e:
+        if str(e) == "usuario":
+            await resposta.finalizar("💜 Calma! Ainda estou respondendo sua última mensagem.")
+        else:
+            await resposta.finalizar("💜 Estou conversando com muita gente agora, tenta de novo daqui a pouco.")
+
+    except IAIndisponivel:
+        await resposta.finalizar("💜 Estou descansando um pouquinho, já já eu volto! Tenta de novo em instantes.")
+
+    except IACota as e:
+        if str(e) == "usuario":
+            await resposta.finalizar(
+                "💜 Você já conversou bastante comigo hoje! Volta amanhã "
+                "ou vire VIP para ter mais conversa 👑"
+            )
+        else:
+            await resposta.finalizar("💜 Esse servidor já usou toda a minha conversa de hoje. Volto amanhã!")
+
+    except Exception as e:
+        print("ERRO IA:", e)
+        await resposta.finalizar("💜 Tive um erro agora, tenta novamente.")
+
+
+class AgrupadorIA:
+    # Debounce por (usuário, canal): mensagens seguidas viram uma única
+    # chamada e uma única resposta. Mensagem nova cancela a chamada em
+    # andamento da mesma rajada e recomeça com o texto acumulado.
+    def __init__(self, janela: float):
+        self.janela = janela
+        self._rajadas = {}  # (uid, canal) -> (partes, task)
+
+    def __len__(self):
+        return len(self._rajadas)
+
+    @staticmethod
+    def _chave(message: discord.Message) -> tuple:
+        return message.author.id, message.channel.id
+
+    def receber(self, message: discord.Message, content: str):
+        chave = self._chave(message)
+        partes, anterior = self._rajadas.get(chave, ([], None))
+        if anterior:
+            anterior.cancel()
+        partes.append(content)
+        task = asyncio.create_task(self._responder(chave, message, partes, anterior))
+        self._rajadas[chave] = (partes, task)
+
+    def fechar(self, message: discord.Message):
+        chave = self._chave(message)
+        rajada = self._rajadas.get(chave)
+        if rajada and rajada[1] is asyncio.current_task():
+            del self._rajadas[chave]
+
+    async def _responder(self, chave, message, partes, anterior):
+        try:
+            if anterior:
+                # espera o cancelamento liberar a vaga e o placeholder
+                await asyncio.wait([anterior])
+            await asyncio.sleep(self.janela)
+            await responder_ia(message, "\n".join(partes))
+        finally:
+            self.fechar(message)
+
+
+agrupador_ia = AgrupadorIA(IA_DEBOUNCE)
+
 
-    db.commit()
-    return reply
 OWNER_ID = 1287910036131151937  # SEU ID
 
 @tasks.loop(minutes=10)
@@ -313,6 +2207,46 @@ async def sair_se_owner_nao_estiver():
 
 
 
+class Despachante:
+    # Classifica cada mensagem uma única vez com checagens baratas (guild,
+    # substring da menção, startswith do prefixo) e só chama quem se
+    # importa com aquela classe. A lista de menções só é percorrida em
+    # respostas (reply com ping não deixa a marca no texto).
+    COMUM, DM, MENCAO, PREFIXO = "comum", "dm", "mencao", "prefixo"
+    ETAPAS = {DM: "on_message.dm", MENCAO: "on_message.mencao", PREFIXO: "process_commands"}
+
+    def __init__(self):
+        self._marcas = None
+        self.contagem = collections.Counter()
+
+    def marcas(self) -> tuple:
+        if self._marcas is None:
+            self._marcas = (f"<@{bot.user.id}>", f"<@!{bot.user.id}>")
+        return self._marcas
+
+    def classificar(self, message: discord.Message) -> str:
+        content = message.content
+        if bot.all_commands and content.startswith(bot.command_prefix):
+            return self.PREFIXO
+        if message.guild is None:
+            return self.DM
+
+        marca, marca_nick = self.marcas()
+        if marca in content or marca_nick in content:
+            return self.MENCAO
+        if message.reference is not None and bot.user in message.mentions:
+            return self.MENCAO
+        return self.COMUM
+
+    def texto_para_ia(self, message: discord.Message) -> str:
+        marca, marca_nick = self.marcas()
+        content = message.content.replace(marca, "").replace(marca_nick, "").strip()
+        return content or "Oi!"
+
+
+despachante = Despachante()
+
+
 @bot.event
 async def on_message(message: discord.Message):
     if message.author.bot:
@@ -320,38 +2254,95 @@ async def on_message(message: discord.Message):
 
     uid = message.author.id
 
-    # 💰 Economia passiva
-    add_saldo(uid, int(2 * vip_bonus(uid)))
+    # 💰 Economia passiva (em memória; gravada em lote pelo ledger)
+    await ledger.creditar(uid, int(2 * vip_bonus(uid)))
 
+    tipo = despachante.classificar(message)
+    despachante.contagem[tipo] += 1
 
+    # caminho quente: mensagem comum só é contada, medir custaria mais que ela
+    if tipo is Despachante.COMUM:
+        return
 
-    # 🧠 IA responde em DM ou quando mencionada
-    is_dm = isinstance(message.channel, discord.DMChannel)
-    is_mention = bot.user in message.mentions
-
-    if is_dm or is_mention:
-        try:
-            content = message.content.replace(f"<@{bot.user.id}>", "").strip()
-            if not content:
-                content = "Oi!"
-
-            reply = await ask_groq(uid, content)
-            await message.reply(reply)
-
-        except Exception as e:
-            print("ERRO IA:", e)
-            await message.reply("💜 Tive um erro agora, tenta novamente.")
-
-    await bot.process_commands(message)
+    t0 = time.perf_counter()
+    if tipo is Despachante.PREFIXO:
+        await bot.process_commands(message)
+    else:
+        # 🧠 IA responde em DM ou quando mencionada, em background,
+        # juntando rajadas do mesmo usuário
+        agrupador_ia.receber(message, despachante.texto_para_ia(message))
+    perf.registrar(Despachante.ETAPAS[tipo], time.perf_counter() - t0)
 
 
 # ===============================
 # 🔹 TASKS
 # ===============================
-@tasks.loop(minutes=30)
+@tasks.loop(seconds=JUROS_PERIODO)
 async def juros():
-    cursor.execute("UPDATE users SET banco = banco * 1.02")
-    db.commit()
+    # O(usuários ativos): os demais recebem os juros na próxima leitura
+    uids = list(juros_ativos)
+    juros_ativos.clear()
+    if not uids:
+        return
+
+    agora = time.time()
+
+    def job(conn):
+        for uid in uids:
+            _acumular_juros(conn, uid, agora, criar=False)
+
+    try:
+        await db.transaction(job)
+    except Exception as e:
+        juros_ativos.update(uids)  # tenta de novo no próximo ciclo
+        print("ERRO JUROS:", e)
+        return
+    perfis.invalidar(*uids)
+
+
+ECONOMIA_COLUNAS = ("usuarios", "coins", "banco", "xp", "vip_1", "vip_2", "vip_3", "vip_4")
+ECONOMIA_SCAN = """
+    SELECT
+        (SELECT COUNT(*) FROM users),
+        (SELECT IFNULL(SUM(coins), 0) FROM users),
+        (SELECT IFNULL(SUM(banco), 0) FROM users),
+        (SELECT IFNULL(SUM(xp), 0) FROM users),
+        (SELECT COUNT(*) FROM vip WHERE nivel = 1),
+        (SELECT COUNT(*) FROM vip WHERE nivel = 2),
+        (SELECT COUNT(*) FROM vip WHERE nivel = 3),
+        (SELECT COUNT(*) FROM vip WHERE nivel = 4)
+"""
+
+
+@tasks.loop(hours=1)
+async def conferir_economia():
+    # Confere economia_stats contra um scan completo numa conexão de
+    # leitura (uma única query = um único snapshot). Só se divergir
+    # corrige, recalculando dentro de uma transação de escrita.
+    def comparar(conn):
+        return conn.execute(
+            f"SELECT {', '.join('s.' + c for c in ECONOMIA_COLUNAS)}, q.* "
+            f"FROM economia_stats s, ({ECONOMIA_SCAN}) q WHERE s.id = 1"
+        ).fetchone()
+
+    def corrigir(conn):
+        real = conn.execute(ECONOMIA_SCAN).fetchone()
+        conn.execute(
+            f"UPDATE economia_stats SET {', '.join(c + '=?' for c in ECONOMIA_COLUNAS)} WHERE id = 1",
+            real
+        )
+        return real
+
+    try:
+        row = await db.read(comparar)
+        n = len(ECONOMIA_COLUNAS)
+        if row[:n] == row[n:]:
+            return
+
+        real = await db.transaction(corrigir)
+        print(f"⚠️ economia_stats corrigido: {row[:n]} -> {tuple(real)}")
+    except Exception as e:
+        print("ERRO ECONOMIA:", e)
 
 # ===============================
 # 🔹 READY
@@ -359,8 +2350,269 @@ async def juros():
 @bot.event
 async def on_ready():
     await bot.tree.sync()
-    juros.start()
+    if not juros.is_running():
+        juros.start()
+    if not enviar_pista_tesouro.is_running():
+        enviar_pista_tesouro.start()
     print("✅ BOT ONLINE | SISTEMA PREMIUM ATIVO")
+
+# ===============================
+# 🔹 ENDPOINT DE MÉTRICAS (PROMETHEUS)
+# ===============================
+METRICAS_PORTA = int(os.getenv("METRICAS_PORTA", "0"))  # 0 = desligado
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+LAG_INTERVALO = 0.5
+
+
+def _rotulos(**rotulos) -> str:
+    pares = []
+    for k, v in rotulos.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{k}="{v}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class Metricas:
+    # Texto no formato do Prometheus servido pelo aiohttp dentro do
+    # próprio loop do bot (sem thread). Desligado por padrão; quando
+    # ligado escuta só em localhost. O lag do loop é medido sempre.
+    def __init__(self):
+        self.gateway = collections.Counter()  # tipo do evento -> quantos
+        self.lag = 0.0
+        self.lag_max = 0.0
+        self._runner = None
+        self._lag_task = None
+
+    async def iniciar(self):
+        self._lag_task = asyncio.create_task(self._medir_lag())
+        if not METRICAS_PORTA:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._servir)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, METRICAS_HOST, METRICAS_PORTA).start()
+        print(f"📈 Métricas em http://{METRICAS_HOST}:{METRICAS_PORTA}/metrics")
+
+    async def parar(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _medir_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(LAG_INTERVALO)
+            self.lag = max(0.0, loop.time() - t0 - LAG_INTERVALO)
+            self.lag_max = max(self.lag_max, self.lag)
+            perf.registrar("loop.lag", self.lag)
+
+    async def _servir(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.texto(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Prometheus-Format": "0.0.4"}
+        )
+
+    def texto(self) -> str:
+        linhas = []
+
+        def metrica(nome: str, tipo: str, ajuda: str, valores):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in valores:
+                linhas.append(f"{nome}{_rotulos(**rotulos) if rotulos else ''} {valor}")
+
+        metrica("mari_uptime_seconds", "gauge", "Segundos desde o boot.",
+                [({}, round(time.time() - START_TIME, 1))])
+        metrica("mari_guilds", "gauge", "Servidores em que o bot está.",
+                [({}, len(bot.guilds))])
+        metrica("mari_gateway_events_total", "counter", "Eventos recebidos do gateway por tipo.",
+                [({"tipo": t}, n) for t, n in sorted(self.gateway.items())])
+        metrica("mari_mensagens_total", "counter", "Mensagens por classe no on_message.",
+                [({"classe": c}, n) for c, n in sorted(despachante.contagem.items())])
+
+        # etapas do /perf (DB, Groq, comandos...) como summary
+        linhas.append("# HELP mari_etapa_seconds Tempo por etapa desde o boot.")
+        linhas.append("# TYPE mari_etapa_seconds summary")
+        comandos = []
+        for nome, h in sorted(perf.ranking(), key=lambda x: x[0]):
+            for q, us in zip((0.5, 0.95, 0.99), h.percentis((0.5, 0.95, 0.99))):
+                linhas.append(f"mari_etapa_seconds{_rotulos(etapa=nome, quantile=q)} {us / 1e6}")
+            linhas.append(f"mari_etapa_seconds_sum{_rotulos(etapa=nome)} {h.soma / 1e6}")
+            linhas.append(f"mari_etapa_seconds_count{_rotulos(etapa=nome)} {h.n}")
+            if nome.startswith("cmd."):
+                comandos.append(({"comando": nome[4:]}, h.n))
+        metrica("mari_comandos_total", "counter", "Slash commands executados.", comandos)
+
+        metrica("mari_interacoes_expiradas_total", "counter", "Slash commands que expiraram antes do ack (erro 10062).",
+                [({"comando": c}, n) for c, n in sorted(lentos.expiradas.items())])
+        metrica("mari_comandos_falhos_total", "counter", "Slash commands que falharam (check ou exceção).",
+                [({"comando": c}, n) for c, n in sorted(lentos.falhas.items())])
+        metrica("mari_comandos_lentos_total", "counter", "Slash commands gravados no log de lentos.",
+                [({}, lentos.lentos)])
+
+        metrica("mari_groq_erros_total", "counter", "Erros nas chamadas à Groq por tipo.",
+                [({"tipo": t}, n) for t, n in sorted(disjuntor_ia.erros.items())])
+        metrica("mari_groq_disjuntor", "gauge", "Estado do disjuntor da IA (1 = atual).",
+                [({"estado": e}, int(disjuntor_ia.estado == e)) for e in ("fechado", "meio_aberto", "aberto")])
+        metrica("mari_groq_recusadas_total", "counter", "Pedidos recusados com o disjuntor aberto.",
+                [({}, disjuntor_ia.recusadas)])
+        metrica("mari_ia_fila", "gauge", "Pedidos de IA esperando vaga.",
+                [({}, limitador_ia.esperando)])
+
+        loops = {
+            "juros": juros,
+            "enviar_pista_tesouro": enviar_pista_tesouro,
+            "flush_ledger": flush_ledger,
+            "flush_memoria_ia": flush_memoria_ia,
+            "flush_uso_ia": flush_uso_ia,
+            "conferir_economia": conferir_economia,
+        }
+        metrica("mari_task_loop_runs_total", "counter", "Iterações de cada tasks.loop.",
+                [({"task": n}, t.current_loop) for n, t in loops.items()])
+        metrica("mari_task_loop_rodando", "gauge", "1 se o tasks.loop está rodando.",
+                [({"task": n}, int(t.is_running())) for n, t in loops.items()])
+
+        metrica("mari_cache_itens", "gauge", "Itens em cada cache em memória.", [
+            ({"cache": "perfis"}, len(perfis)),
+            ({"cache": "vips"}, len(vips)),
+            ({"cache": "ia_respostas"}, len(cache_ia)),
+            ({"cache": "ia_memoria"}, len(memoria_ia)),
+            ({"cache": "ledger"}, len(ledger)),
+            ({"cache": "ia_rajadas"}, len(agrupador_ia)),
+        ])
+        metrica("mari_cache_bytes", "gauge", "Bytes usados pelo cache de respostas da IA.",
+                [({"cache": "ia_respostas"}, cache_ia.bytes)])
+        metrica("mari_cache_hits_total", "counter", "Acertos de cache.",
+                [({"cache": "perfis"}, perfis.hits), ({"cache": "ia_respostas"}, cache_ia.hits)])
+        metrica("mari_cache_misses_total", "counter", "Faltas de cache.",
+                [({"cache": "perfis"}, perfis.misses), ({"cache": "ia_respostas"}, cache_ia.misses)])
+
+        metrica("mari_loop_lag_seconds", "gauge", "Atraso do event loop na última medição.",
+                [({}, round(self.lag, 6))])
+        metrica("mari_loop_lag_max_seconds", "gauge", "Maior atraso do event loop desde o boot.",
+                [({}, round(self.lag_max, 6))])
+        metrica("mari_loop_travamentos_total", "counter",
+                f"Vezes que o event loop ficou preso mais de {VIGIA_LIMITE}s.",
+                [({}, vigia.travamentos)])
+
+        return "\n".join(linhas) + "\n"
+
+
+metricas = Metricas()
+
+# ===============================
+# 🔹 VIGIA DO EVENT LOOP
+# ===============================
+VIGIA_INTERVALO = 0.05  # batimento do loop e frequência da thread
+VIGIA_LIMITE = float(os.getenv("VIGIA_LIMITE", "0.25"))  # s sem batimento = travado
+VIGIA_MAX_LOCAIS = 50
+VIGIA_QUADROS = 6  # quadros guardados por pilha
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+class VigiaLoop:
+    # Uma task no loop bate a cada VIGIA_INTERVALO; uma thread separada
+    # confere o batimento e, se o loop ficou preso mais que VIGIA_LIMITE,
+    # fotografa a pilha da thread do loop com sys._current_frames(). O
+    # relatório é agrupado pelo local da chamada que travou (o quadro
+    # mais interno deste arquivo + o quadro mais interno de todos).
+    # A thread só lê a pilha: locais, contadores e perf são atualizados
+    # no loop via call_soon_threadsafe, quando ele volta a rodar.
+    def __init__(self):
+        self.locais = {}  # local -> {"n", "pior", "total", "ultimo", "pilha"}
+        self.travamentos = 0
+        self._batida = time.monotonic()
+        self._loop = None
+        self._thread_loop = None
+        self._parar = threading.Event()
+        self._task = None
+        self._thread = None
+
+    def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread_loop = threading.get_ident()
+        self._batida = time.monotonic()
+        self._parar.clear()
+        self._task = asyncio.create_task(self._bater())
+        self._thread = threading.Thread(target=self._vigiar, name="vigia-loop", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if self._task:
+            self._task.cancel()
+        self._parar.set()
+
+    async def _bater(self):
+        while True:
+            self._batida = time.monotonic()
+            await asyncio.sleep(VIGIA_INTERVALO)
+
+    def _vigiar(self):
+        # roda na thread do vigia
+        travado = None  # (local, pilha, batida) do travamento em curso
+        pior = 0.0
+        while not self._parar.wait(VIGIA_INTERVALO):
+            batida = self._batida
+            atraso = time.monotonic() - batida - VIGIA_INTERVALO
+
+            if travado and travado[2] != batida:
+                try:
+                    self._loop.call_soon_threadsafe(self._fechar, travado[0], travado[1], pior)
+                except RuntimeError:  # loop já fechado
+                    return
+                travado = None
+
+            if atraso < VIGIA_LIMITE:
+                continue
+            if travado is None:
+                quadro = sys._current_frames().get(self._thread_loop)
+                if quadro is None:
+                    continue
+                travado = (*self._capturar(quadro), batida)
+            pior = atraso
+
+    @staticmethod
+    def _capturar(quadro) -> tuple:
+        # roda na thread do vigia: só lê a pilha, não toca em estado compartilhado
+        pilha = traceback.extract_stack(quadro)
+        del quadro
+        nosso = next((q for q in reversed(pilha) if q.filename == __file__), None)
+        fundo = pilha[-1]
+        local = f"{os.path.basename(fundo.filename)}:{fundo.lineno} {fundo.name}"
+        if nosso and nosso is not fundo:
+            local = f"Main.py:{nosso.lineno} {nosso.name} → {local}"
+
+        # os quadros do próprio asyncio só repetem o _run_once
+        pilha = [q for q in pilha if not q.filename.startswith(_ASYNCIO_DIR)] or pilha
+        return local, "".join(traceback.format_list(pilha[-VIGIA_QUADROS:]))
+
+    def _fechar(self, local: str, pilha: str, atraso: float):
+        info = self.locais.get(local)
+        if info is None:
+            if len(self.locais) >= VIGIA_MAX_LOCAIS:
+                # sai o local que travou menos vezes
+                del self.locais[min(self.locais, key=lambda k: self.locais[k]["n"])]
+            info = self.locais[local] = {"n": 0, "pior": 0.0, "total": 0.0, "ultimo": 0.0, "pilha": pilha}
+            print(f"⚠️ Loop travado em {local}\n{pilha}", end="")
+
+        self.travamentos += 1
+        info["n"] += 1
+        info["pior"] = max(info["pior"], atraso)
+        info["total"] += atraso
+        info["ultimo"] = time.time()
+        perf.registrar("loop.travado", atraso)
+
+    def ranking(self) -> list:
+        return sorted(self.locais.items(), key=lambda kv: kv[1]["total"], reverse=True)
+
+
+vigia = VigiaLoop()
 # ===============================
 # 🤖 UTILIDADE
 # ===============================
@@ -425,72 +2677,58 @@ async def feedback(i: discord.Interaction, mensagem: str):
 
 @bot.tree.command(description="💰 Ver saldo")
 async def saldo_cmd(i: discord.Interaction):
+    perfil = await get_profile(i.user.id)
     await i.response.send_message(
-        f"💰 Carteira: **{saldo(i.user.id)}**\n"
-        f"🏦 Banco: **{banco(i.user.id)}**",
+        f"💰 Carteira: **{perfil.coins}**\n"
+        f"🏦 Banco: **{perfil.banco}**",
         ephemeral=True
     )
 
 
 @bot.tree.command(description="🎁 Daily")
 async def daily(i: discord.Interaction):
-    cursor.execute("SELECT last_daily FROM users WHERE user_id=?", (i.user.id,))
-    last = cursor.fetchone()[0]
+    last = (await get_profile(i.user.id)).last_daily
     now = time.time()
 
     if now - last < 86400:
         return await i.response.send_message("⏳ Daily já coletado.", ephemeral=True)
 
     ganho = int(500 * vip_bonus(i.user.id))
-    add_saldo(i.user.id, ganho)
+    await add_saldo(i.user.id, ganho)
 
-    cursor.execute(
-        "UPDATE users SET last_daily=? WHERE user_id=?",
-        (now, i.user.id)
-    )
-    db.commit()
+    await marcar_cooldown(i.user.id, "last_daily", now)
 
     await i.response.send_message(f"🎁 Você ganhou **{ganho} PixCoins**!")
 
 
 @bot.tree.command(description="🎁 Weekly")
 async def weekly(i: discord.Interaction):
-    cursor.execute("SELECT last_weekly FROM users WHERE user_id=?", (i.user.id,))
-    last = cursor.fetchone()[0]
+    last = (await get_profile(i.user.id)).last_weekly
     now = time.time()
 
     if now - last < 604800:
         return await i.response.send_message("⏳ Weekly já coletado.", ephemeral=True)
 
     ganho = int(2500 * vip_bonus(i.user.id))
-    add_saldo(i.user.id, ganho)
+    await add_saldo(i.user.id, ganho)
 
-    cursor.execute(
-        "UPDATE users SET last_weekly=? WHERE user_id=?",
-        (now, i.user.id)
-    )
-    db.commit()
+    await marcar_cooldown(i.user.id, "last_weekly", now)
 
     await i.response.send_message(f"🎁 Você ganhou **{ganho} PixCoins**!")
 
 
 @bot.tree.command(description="💼 Trabalhar")
 async def work(i: discord.Interaction):
-    cursor.execute("SELECT last_work FROM users WHERE user_id=?", (i.user.id,))
-    last = cursor.fetchone()[0]
+    last = (await get_profile(i.user.id)).last_work
     now = time.time()
 
     if now - last < 3600:
         return await i.response.send_message("⏳ Você já trabalhou.", ephemeral=True)
 
     ganho = int(random.randint(300, 700) * vip_bonus(i.user.id))
-    add_saldo(i.user.id, ganho)
+    await add_saldo(i.user.id, ganho)
 
-    cursor.execute(
-        "UPDATE users SET last_work=? WHERE user_id=?",
-        (now, i.user.id)
-    )
-    db.commit()
+    await marcar_cooldown(i.user.id, "last_work", now)
 
     await i.response.send_message(f"💼 Você ganhou **{ganho} PixCoins**!")
 
@@ -499,21 +2737,22 @@ async def work(i: discord.Interaction):
 async def crime(i: discord.Interaction):
     if random.random() < 0.5:
         perda = random.randint(200, 500)
-        add_saldo(i.user.id, -perda)
+        await add_saldo(i.user.id, -perda)
         await i.response.send_message(f"🚔 Você perdeu **{perda} PixCoins**!")
     else:
         ganho = random.randint(400, 900)
-        add_saldo(i.user.id, ganho)
+        await add_saldo(i.user.id, ganho)
         await i.response.send_message(f"💰 Você ganhou **{ganho} PixCoins**!")
 
 
 @bot.tree.command(description="💸 Pagar usuário")
 async def pay(i: discord.Interaction, user: discord.Member, valor: int):
-    if valor <= 0 or saldo(i.user.id) < valor:
+    if valor <= 0 or not await transacao(
+        (i.user.id, "coins", -valor),
+        (user.id, "coins", valor)
+    ):
         return await i.response.send_message("❌ Valor inválido.", ephemeral=True)
 
-    add_saldo(i.user.id, -valor)
-    add_saldo(user.id, valor)
     await i.response.send_message(
         f"💸 Você transferiu **{valor} PixCoins** para {user.mention}"
     )
@@ -521,41 +2760,47 @@ async def pay(i: discord.Interaction, user: discord.Member, valor: int):
 
 @bot.tree.command(description="🏦 Depositar")
 async def deposit(i: discord.Interaction, valor: int):
-    if valor <= 0 or saldo(i.user.id) < valor:
+    if valor <= 0 or not await transacao(
+        (i.user.id, "coins", -valor),
+        (i.user.id, "banco", valor)
+    ):
         return await i.response.send_message("❌ Valor inválido.", ephemeral=True)
 
-    add_saldo(i.user.id, -valor)
-    add_banco(i.user.id, valor)
     await i.response.send_message(f"🏦 Depositado **{valor} PixCoins**!")
 
 
 @bot.tree.command(description="🏧 Sacar")
 async def withdraw(i: discord.Interaction, valor: int):
-    if valor <= 0 or banco(i.user.id) < valor:
+    if valor <= 0 or not await transacao(
+        (i.user.id, "banco", -valor),
+        (i.user.id, "coins", valor)
+    ):
         return await i.response.send_message("❌ Valor inválido.", ephemeral=True)
 
-    add_banco(i.user.id, -valor)
-    add_saldo(i.user.id, valor)
     await i.response.send_message(f"🏧 Sacado **{valor} PixCoins**!")
 
 
 @bot.tree.command(description="🏆 Ranking de PixCoins")
-async def ranking(i: discord.Interaction):
-    cursor.execute(
-        "SELECT user_id, coins + banco FROM users ORDER BY coins + banco DESC LIMIT 10"
-    )
-    rows = cursor.fetchall()
+@app_commands.describe(pagina="Página do ranking (10 por página)")
+async def ranking(i: discord.Interaction, pagina: app_commands.Range[int, 1, 100_000] = 1):
+    rows = await ranking_pix.pagina(pagina)
+    minha = await ranking_pix.posicao(i.user.id)
 
     desc = ""
-    for pos, (uid, total) in enumerate(rows, 1):
+    inicio = (pagina - 1) * RANKING_POR_PAGINA
+    for pos, (uid, total) in enumerate(rows, inicio + 1):
         user = bot.get_user(uid)
         desc += f"**{pos}.** {user.name if user else uid} — {int(total)}\n"
 
     embed = discord.Embed(
         title="🏆 Ranking Global",
-        description=desc,
+        description=desc or "Nenhum usuário nesta página.",
         color=discord.Color.gold()
     )
+    embed.set_footer(
+        text=(f"Página {pagina} • Sua posição: #{minha[0]}" if minha else f"Página {pagina}")
+        + " • Juros pendentes entram ao serem gravados"
+    )
     await i.response.send_message(embed=embed)
 
 
@@ -576,15 +2821,19 @@ async def apostar(
             ephemeral=True
         )
 
-    if valor <= 0 or saldo(i.user.id) < valor:
+    if valor <= 0:
         return await i.response.send_message("❌ Aposta inválida.", ephemeral=True)
 
-    add_saldo(i.user.id, -valor)
     resultado = random.choice(["cara", "coroa"])
+    ganho = int(valor * 2 * vip_bonus(i.user.id)) if escolha == resultado else 0
+
+    if not await transacao(
+        (i.user.id, "coins", -valor),
+        (i.user.id, "coins", ganho)
+    ):
+        return await i.response.send_message("❌ Aposta inválida.", ephemeral=True)
 
-    if escolha == resultado:
-        ganho = int(valor * 2 * vip_bonus(i.user.id))
-        add_saldo(i.user.id, ganho)
+    if ganho:
         await i.response.send_message(
             f"🎉 Deu **{resultado}**!\nVocê ganhou **{ganho} PixCoins**!"
         )
@@ -593,6 +2842,33 @@ async def apostar(
             f"😢 Deu **{resultado}**...\nVocê perdeu **{valor} PixCoins**."
         )
 
+
+@bot.tree.command(description="📊 Estatísticas da economia")
+async def economia(i: discord.Interaction):
+    usuarios, coins, banco_, xp, *vips_nivel = await db.fetchone(
+        f"SELECT {', '.join(ECONOMIA_COLUNAS)} FROM economia_stats WHERE id = 1"
+    )
+
+    embed = discord.Embed(
+        title="📊 Economia • PixCoin",
+        color=discord.Color.green()
+    )
+    embed.add_field(name="💰 Em circulação", value=coins + banco_)
+    embed.add_field(name="👛 Carteiras", value=coins)
+    embed.add_field(name="🏦 Bancos", value=banco_)
+    embed.add_field(name="👥 Usuários", value=usuarios)
+    embed.add_field(name="⭐ XP total", value=xp)
+    embed.add_field(
+        name="👑 VIPs",
+        value="\n".join(
+            f"{VIP_NOMES[n]}: {qtd}" for n, qtd in enumerate(vips_nivel, 1)
+        ),
+        inline=False
+    )
+    embed.set_footer(text="Juros e renda passiva pendentes entram ao serem gravados")
+
+    await i.response.send_message(embed=embed)
+
 # ===============================
 # 👑 VIP
 # ===============================
@@ -628,11 +2904,7 @@ async def vip_comprar(
 ):
     exp = -1 if dias <= 0 else time.time() + dias * 86400
 
-    cursor.execute(
-        "REPLACE INTO vip (user_id, nivel, expires) VALUES (?, ?, ?)",
-        (user.id, nivel, exp)
-    )
-    db.commit()
+    await vips.definir(user.id, nivel, exp)
 
     await i.response.send_message(
         f"✅ {user.mention} recebeu VIP **{VIP_NOMES[nivel]}**!"
@@ -644,7 +2916,7 @@ async def vip_comprar(
 
 @bot.tree.command(description="⭐ Ver nível")
 async def level(i: discord.Interaction):
-    xp = get_xp(i.user.id)
+    xp = await get_xp(i.user.id)
     lvl = calc_level(xp)
 
     await i.response.send_message(
@@ -654,22 +2926,26 @@ async def level(i: discord.Interaction):
 
 
 @bot.tree.command(description="⭐ Ranking de XP")
-async def ranking_xp(i: discord.Interaction):
-    cursor.execute(
-        "SELECT user_id, xp FROM users ORDER BY xp DESC LIMIT 10"
-    )
-    rows = cursor.fetchall()
+@app_commands.describe(pagina="Página do ranking (10 por página)")
+async def ranking_xp(i: discord.Interaction, pagina: app_commands.Range[int, 1, 100_000] = 1):
+    rows = await ranking_lvl.pagina(pagina)
+    minha = await ranking_lvl.posicao(i.user.id)
 
     desc = ""
-    for pos, (uid, xp) in enumerate(rows, 1):
+    inicio = (pagina - 1) * RANKING_POR_PAGINA
+    for pos, (uid, xp) in enumerate(rows, inicio + 1):
         user = bot.get_user(uid)
         desc += f"**{pos}.** {user.name if user else uid} — {xp} XP\n"
 
     embed = discord.Embed(
         title="⭐ Ranking de XP",
-        description=desc,
+        description=desc or "Nenhum usuário nesta página.",
         color=discord.Color.purple()
     )
+    embed.set_footer(
+        text=f"Página {pagina} • Sua posição: #{minha[0]}" if minha
+        else f"Página {pagina}"
+    )
     await i.response.send_message(embed=embed)
 
 # ===============================
@@ -773,7 +3049,7 @@ class HelpView(discord.ui.View):
             title="💰 Economia • PixCoin",
             description=(
                 "/saldo\n/daily\n/weekly\n/work\n/crime\n"
-                "/pay\n/deposit\n/withdraw\n/ranking\n/apostar\n/mines"
+                "/pay\n/deposit\n/withdraw\n/ranking\n/apostar\n/mines\n/economia"
             ),
             color=discord.Color.green()
         )
@@ -1078,16 +3354,24 @@ async def mines(
     minas: app_commands.Range[int, 1, 15],
     aposta: int
 ):
-    if aposta <= 0 or saldo(i.user.id) < aposta:
+    if aposta <= 0:
         return await i.response.send_message(
             "❌ Aposta inválida.",
             ephemeral=True
         )
 
-    add_saldo(i.user.id, -aposta)
-
     bombas = random.sample(range(1, 17), minas)
     multiplicador = (1 + minas * 0.35) * vip_bonus(i.user.id)
+    ganho = 0 if posicao in bombas else int(aposta * multiplicador)
+
+    if not await transacao(
+        (i.user.id, "coins", -aposta),
+        (i.user.id, "coins", ganho)
+    ):
+        return await i.response.send_message(
+            "❌ Aposta inválida.",
+            ephemeral=True
+        )
 
     tab = ""
     for n in range(1, 17):
@@ -1109,9 +3393,6 @@ async def mines(
             value=f"Você perdeu **{aposta} PixCoins**"
         )
     else:
-        ganho = int(aposta * multiplicador)
-        add_saldo(i.user.id, ganho)
-
         embed = discord.Embed(
             title="💎 Vitória!",
             description=tab,
@@ -1230,17 +3511,22 @@ async def criar_embed(
 
 @bot.tree.command(description="📈 Investir PixCoins")
 async def investir(i: discord.Interaction, valor: int):
-    if valor <= 0 or saldo(i.user.id) < valor:
+    if valor <= 0:
         return await i.response.send_message("❌ Valor inválido.")
 
-    add_saldo(i.user.id, -valor)
+    falhou = random.random() < 0.45
+    ganho = 0 if falhou else int(valor * random.uniform(1.4, 2.5))
 
-    if random.random() < 0.45:
+    if not await transacao(
+        (i.user.id, "coins", -valor),
+        (i.user.id, "coins", ganho)
+    ):
+        return await i.response.send_message("❌ Valor inválido.")
+
+    if falhou:
         perda = int(valor * random.uniform(0.3, 0.7))
         await i.response.send_message(f"📉 Investimento falhou! Você perdeu **{perda}**")
     else:
-        ganho = int(valor * random.uniform(1.4, 2.5))
-        add_saldo(i.user.id, ganho)
         await i.response.send_message(f"📈 Investimento deu certo! Lucro: **{ganho}**")
 
 @bot.tree.command(description="👑 Transferir VIP")
@@ -1248,36 +3534,23 @@ async def vip_transferir(
     i: discord.Interaction,
     user: discord.Member
 ):
-    if not is_vip(i.user.id):
+    nivel = await vips.transferir(i.user.id, user.id)
+    if not nivel:
         return await i.response.send_message(
             "❌ Você não possui VIP.",
             ephemeral=True
         )
 
-    cursor.execute(
-        "SELECT nivel, expires FROM vip WHERE user_id=?",
-        (i.user.id,)
-    )
-    nivel, expires = cursor.fetchone()
-
-    cursor.execute("DELETE FROM vip WHERE user_id=?", (i.user.id,))
-    cursor.execute(
-        "REPLACE INTO vip VALUES (?, ?, ?)",
-        (user.id, nivel, expires)
-    )
-    db.commit()
-
     await i.response.send_message(
         f"👑 VIP **{VIP_NOMES[nivel]}** transferido para {user.mention}"
     )
 @bot.tree.command(description="🛡️ Definir canal de modlog")
 @app_commands.checks.has_permissions(administrator=True)
 async def modlog(i: discord.Interaction, canal: discord.TextChannel):
-    cursor.execute(
+    await db.execute(
         "REPLACE INTO modlog VALUES (?, ?)",
         (i.guild.id, canal.id)
     )
-    db.commit()
 
     await i.response.send_message(
         f"🛡️ ModLog definido para {canal.mention}",
@@ -1285,16 +3558,32 @@ async def modlog(i: discord.Interaction, canal: discord.TextChannel):
     )
 @bot.tree.command(description="🧠 Definir personalidade da IA")
 async def ia_personalidade(i: discord.Interaction, personalidade: str):
-    cursor.execute(
-        "REPLACE INTO ia_personalidade VALUES (?, ?)",
-        (i.user.id, personalidade)
-    )
-    db.commit()
+    await personalidades.definir(i.user.id, personalidade)
 
     await i.response.send_message(
         "🧠 Personalidade da IA atualizada!",
         ephemeral=True
     )
+
+
+@bot.tree.command(description="🧠 Ver seu uso da IA hoje")
+async def ia_uso(i: discord.Interaction):
+    nivel = vip_level(i.user.id)
+    gasto = uso_ia.gasto("u", i.user.id)
+    cota = uso_ia.cota(i.user.id)
+
+    embed = discord.Embed(title="🧠 Uso da IA • Hoje", color=discord.Color.purple())
+    embed.add_field(name="🔢 Tokens usados", value=f"{gasto} / {cota}")
+    embed.add_field(name="👑 Plano", value=VIP_NOMES.get(nivel, "Sem VIP"))
+    if i.guild and IA_COTA_GUILD:
+        embed.add_field(
+            name="🏠 Servidor",
+            value=f"{uso_ia.gasto('g', i.guild.id)} / {IA_COTA_GUILD}",
+            inline=False
+        )
+    embed.set_footer(text="A cota renova todo dia à meia-noite (UTC)")
+
+    await i.response.send_message(embed=embed, ephemeral=True)
 # ===============================
 # 🧠 QUIZ GERAL (TUDO EM UM BLOCO)
 # ===============================
@@ -1433,7 +3722,7 @@ async def quiz(
             if resp == correta or resp == correta_texto:
                 ganho = random.randint(400, 500)
                 premio = int(ganho * vip_bonus(i.user.id))
-                add_saldo(i.user.id, premio)
+                await add_saldo(i.user.id, premio)
                 total += premio
 
                 await msg.add_reaction("⭐")
@@ -1461,7 +3750,8 @@ async def quiz(
 @bot.tree.command(description="👤 Informações do usuário")
 async def userinfo(i: discord.Interaction, user: discord.Member = None):
     user = user or i.user
-    xp = get_xp(user.id)
+    perfil = await get_profile(user.id)
+    xp = perfil.xp
 
     embed = discord.Embed(
         title="👤 User Info",
@@ -1471,11 +3761,11 @@ async def userinfo(i: discord.Interaction, user: discord.Member = None):
     embed.add_field(name="🆔 ID", value=user.id)
     embed.add_field(name="⭐ XP", value=xp)
     embed.add_field(name="🎖️ Level", value=calc_level(xp))
-    embed.add_field(name="💰 PixCoin", value=saldo(user.id))
-    embed.add_field(name="🏦 Banco", value=banco(user.id))
+    embed.add_field(name="💰 PixCoin", value=perfil.coins)
+    embed.add_field(name="🏦 Banco", value=perfil.banco)
     embed.add_field(
         name="👑 VIP",
-        value=VIP_NOMES.get(vip_level(user.id), "Nenhum")
+        value=VIP_NOMES.get(perfil.vip, "Nenhum")
     )
 
     await i.response.send_message(embed=embed)
@@ -1493,7 +3783,7 @@ async def add_pixcoin(
             ephemeral=True
         )
 
-    add_saldo(user.id, valor)
+    await add_saldo(user.id, valor)
 
     await i.response.send_message(
         f"✅ **{valor} PixCoins** adicionados para {user.mention} 💰",
@@ -1551,11 +3841,10 @@ async def unblacklist(i: discord.Interaction, user: discord.Member):
 @bot.tree.command(description="⚠️ Avisar um usuário")
 @app_commands.checks.has_permissions(moderate_members=True)
 async def warn(i: discord.Interaction, user: discord.Member, motivo: str):
-    cursor.execute(
+    await db.execute(
         "INSERT INTO warns VALUES (?, ?, ?, ?)",
         (user.id, i.user.id, motivo, time.time())
     )
-    db.commit()
 
     embed = discord.Embed(
         title="⚠️ Aviso aplicado",
@@ -1618,37 +3907,36 @@ async def anti_fake(i: discord.Interaction, dias: int = 7):
     await i.response.send_message(embed=embed)
 @bot.tree.command(description="🏰 Criar clã")
 async def criar_cla(i: discord.Interaction, nome: str):
-    try:
-        cursor.execute(
+    def criar(conn):
+        clan_id = conn.execute(
             "INSERT INTO clans (nome, lider_id) VALUES (?, ?)",
             (nome, i.user.id)
-        )
-        clan_id = cursor.lastrowid
-        cursor.execute(
+        ).lastrowid
+        conn.execute(
             "INSERT INTO clan_membros VALUES (?, ?)",
             (clan_id, i.user.id)
         )
-        db.commit()
 
-        await i.response.send_message(f"🏰 Clã **{nome}** criado!")
-    except:
-        await i.response.send_message("❌ Nome já em uso.")
+    try:
+        await db.run(criar)
+    except sqlite3.IntegrityError:
+        return await i.response.send_message("❌ Nome já em uso.")
+
+    await i.response.send_message(f"🏰 Clã **{nome}** criado!")
 @bot.tree.command(description="📊 Informações do clã")
 async def cla_info(i: discord.Interaction, nome: str):
-    cursor.execute(
+    clan = await db.fetchone(
         "SELECT clan_id, lider_id, xp FROM clans WHERE nome=?",
         (nome,)
     )
-    clan = cursor.fetchone()
     if not clan:
         return await i.response.send_message("❌ Clã não encontrado.")
 
     clan_id, lider, xp = clan
-    cursor.execute(
+    membros = await db.fetchval(
         "SELECT COUNT(*) FROM clan_membros WHERE clan_id=?",
         (clan_id,)
     )
-    membros = cursor.fetchone()[0]
 
     embed = discord.Embed(
         title=f"🏰 Clã {nome}",
@@ -1908,22 +4196,111 @@ async def list_servers(i: discord.Interaction):
 
     await i.response.send_message(embed=embed, ephemeral=True)
 
+
+@bot.tree.command(description="🩺 Estado da IA (dono do bot)")
+async def ia_status(i: discord.Interaction):
+    if i.user.id != OWNER_ID:
+        return await i.response.send_message(
+            "❌ Apenas o **dono do bot** pode usar este comando.",
+            ephemeral=True
+        )
+
+    d = disjuntor_ia
+    falhas, total = d.falhas()
+    cores = {
+        "fechado": discord.Color.green(),
+        "meio_aberto": discord.Color.orange(),
+        "aberto": discord.Color.red()
+    }
+    icones = {"fechado": "🟢", "meio_aberto": "🟡", "aberto": "🔴"}
+
+    embed = discord.Embed(title="🩺 Estado da IA", color=cores[d.estado])
+    embed.add_field(name="🔌 Disjuntor", value=f"{icones[d.estado]} {d.estado} desde <t:{int(d.desde)}:R>")
+    embed.add_field(name="❌ Falhas (janela)", value=f"{falhas} / {total}")
+    embed.add_field(name="🔁 Aberturas", value=d.aberturas)
+    embed.add_field(name="🚫 Recusadas", value=d.recusadas)
+    embed.add_field(
+        name="⏱️ Latência",
+        value=f"p50 {d.latencia(.5):.2f}s • p95 {d.latencia(.95):.2f}s"
+    )
+    embed.add_field(name="📥 Fila", value=f"{limitador_ia.esperando} esperando")
+    if d.ultimo_erro:
+        quando, erro = d.ultimo_erro
+        embed.add_field(name="🧾 Último erro", value=f"<t:{int(quando)}:R>\n`{erro}`", inline=False)
+
+    await i.response.send_message(embed=embed, ephemeral=True)
+
+
+def _tabela_perf(linhas: list, limite: int) -> str:
+    texto = f"{'etapa':<22}{'n':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'total':>8}\n"
+    for nome, h in linhas[:limite]:
+        p50, p95, p99 = h.percentis((.5, .95, .99))
+        texto += (
+            f"{nome[:21]:<22}{h.n:>7}{fmt_us(p50):>8}"
+            f"{fmt_us(p95):>8}{fmt_us(p99):>8}"
+            f"{fmt_us(h.maximo):>8}{fmt_us(h.soma):>8}\n"
+        )
+    return f"```\n{texto}```" if linhas else "Nada medido ainda."
+
+
+@bot.tree.command(name="perf", description="⏱️ Tempo por etapa do bot (dono do bot)")
+async def perf_cmd(i: discord.Interaction):
+    if i.user.id != OWNER_ID:
+        return await i.response.send_message(
+            "❌ Apenas o **dono do bot** pode usar este comando.",
+            ephemeral=True
+        )
+
+    uptime = int(time.time() - perf.inicio)
+    descricao = (
+        f"**🕔 Últimos {PERF_JANELA} minutos**\n{_tabela_perf(perf.ranking(recente=True), 12)}\n"
+        f"**📈 Desde o início** ({uptime // 3600}h{uptime % 3600 // 60:02d}m)\n"
+        f"{_tabela_perf(perf.ranking(), 12)}"
+    )
+
+    embed = discord.Embed(
+        title="⏱️ Perf • Etapas por tempo total",
+        description=descricao[:4096],
+        color=discord.Color.blurple()
+    )
+    embed.set_footer(text="Ordenado por tempo total gasto • histogramas HDR (~6% de erro)")
+
+    await i.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(description="🧊 Onde o event loop travou (dono do bot)")
+async def travamentos(i: discord.Interaction):
+    if i.user.id != OWNER_ID:
+        return await i.response.send_message(
+            "❌ Apenas o **dono do bot** pode usar este comando.",
+            ephemeral=True
+        )
+
+    embed = discord.Embed(
+        title="🧊 Travamentos do event loop",
+        description=f"**{vigia.travamentos}** travamentos acima de {VIGIA_LIMITE:.2f}s desde o início.",
+        color=discord.Color.blurple() if not vigia.locais else discord.Color.orange()
+    )
+    for local, info in vigia.ranking()[:5]:
+        pilha = info["pilha"][-700:]
+        embed.add_field(
+            name=f"{info['n']}x • pior {info['pior']:.2f}s • total {info['total']:.1f}s"[:256],
+            value=f"`{local[:200]}`\n```\n{pilha}```<t:{int(info['ultimo'])}:R>"[:1024],
+            inline=False
+        )
+    embed.set_footer(text="Agrupado pelo local da chamada • ordenado por tempo total travado")
+
+    await i.response.send_message(embed=embed, ephemeral=True)
+
 @bot.tree.command(description="🏴‍☠️ Caça ao tesouro")
 async def cacatesouro(i: discord.Interaction):
     uid = i.user.id
     now = time.time()
 
-    cursor.execute(
-        "INSERT OR IGNORE INTO cacador (user_id) VALUES (?)",
-        (uid,)
-    )
-    db.commit()
-
-    cursor.execute(
+    last = await db.fetchval(
         "SELECT last_hunt FROM cacador WHERE user_id=?",
-        (uid,)
+        (uid,),
+        0
     )
-    last = cursor.fetchone()[0]
 
     if now - last < TESOURO_COOLDOWN:
         restante = int((TESOURO_COOLDOWN - (now - last)) / 60)
@@ -1936,22 +4313,21 @@ async def cacatesouro(i: discord.Interaction):
 
     if chance < 0.55:
         ganho = int(random.randint(800, 1500) * vip_bonus(uid))
-        add_saldo(uid, ganho)
+        await add_saldo(uid, ganho)
         resultado = f"💎 Você encontrou um tesouro!\n💰 **+{ganho} PixCoins**"
     elif chance < 0.80:
         ganho = int(random.randint(200, 600) * vip_bonus(uid))
-        add_saldo(uid, ganho)
+        await add_saldo(uid, ganho)
         resultado = f"🪙 Achado comum!\n💰 **+{ganho} PixCoins**"
     else:
         perda = random.randint(200, 500)
-        add_saldo(uid, -perda)
+        await add_saldo(uid, -perda)
         resultado = f"💥 Armadilha!\n❌ **-{perda} PixCoins**"
 
-    cursor.execute(
-        "UPDATE cacador SET last_hunt=? WHERE user_id=?",
-        (now, uid)
+    await db.execute(
+        "REPLACE INTO cacador (user_id, last_hunt) VALUES (?, ?)",
+        (uid, now)
     )
-    db.commit()
 
     embed = discord.Embed(
         title="🏴‍☠️ Caça ao Tesouro",
@@ -2004,21 +4380,6 @@ PISTAS_FALSAS = [
 TESOURO_INTERVALO = 3 * 60 * 60  # 3 horas
 TESOURO_MAX_VENCEDORES = 3
 
-# ===============================
-# 📦 BANCO DE DADOS
-# ===============================
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS tesouro (
-    etapa INTEGER DEFAULT 0,
-    vencedores INTEGER DEFAULT 0
-)
-""")
-db.commit()
-
-cursor.execute("INSERT OR IGNORE INTO tesouro (rowid) VALUES (1)")
-db.commit()
-
 # ===============================
 # 🔧 FUNÇÕES AUXILIARES
 # ===============================
@@ -2046,8 +4407,7 @@ async def enviar_pista_tesouro():
     if not horario_permitido():
         return
 
-    cursor.execute("SELECT etapa, vencedores FROM tesouro")
-    etapa, vencedores = cursor.fetchone()
+    etapa, vencedores = await db.fetchone("SELECT etapa, vencedores FROM tesouro")
 
     if vencedores >= TESOURO_MAX_VENCEDORES:
         return
@@ -2074,8 +4434,7 @@ async def enviar_pista_tesouro():
             f"> {pista}"
         )
 
-    cursor.execute("UPDATE tesouro SET etapa = etapa + 1")
-    db.commit()
+    await db.execute("UPDATE tesouro SET etapa = etapa + 1")
 
 # ===============================
 # 🏆 COMANDO DE RESGATE
@@ -2085,8 +4444,7 @@ async def enviar_pista_tesouro():
 async def tesouro(i: discord.Interaction, codigo: str):
     codigo = codigo.upper().strip()
 
-    cursor.execute("SELECT vencedores FROM tesouro")
-    vencedores = cursor.fetchone()[0]
+    vencedores = await db.fetchval("SELECT vencedores FROM tesouro")
 
     if vencedores >= TESOURO_MAX_VENCEDORES:
         return await i.response.send_message(
@@ -2097,12 +4455,9 @@ async def tesouro(i: discord.Interaction, codigo: str):
         return await i.response.send_message("❌ Código incorreto.")
 
     # prêmio
-    add_saldo(i.user.id, 100_000)
+    await add_saldo(i.user.id, 100_000)
 
-    cursor.execute(
-        "REPLACE INTO vip VALUES (?, ?, ?)",
-        (i.user.id, 2, -1)  # VIP OURO
-    )
+    await vips.definir(i.user.id, 2, -1)  # VIP OURO
 
     cargo = discord.utils.get(i.guild.roles, name="🏴‍☠️ Caçador de Tesouros")
     if not cargo:
@@ -2113,10 +4468,9 @@ async def tesouro(i: discord.Interaction, codigo: str):
 
     await i.user.add_roles(cargo)
 
-    cursor.execute(
+    await db.execute(
         "UPDATE tesouro SET vencedores = vencedores + 1"
     )
-    db.commit()
 
     await i.response.send_message(
         "🏆 **PARABÉNS!**\n"
@@ -2125,13 +4479,5 @@ async def tesouro(i: discord.Interaction, codigo: str):
         "🏷️ Cargo: Caçador de Tesouros"
     )
 
-# ===============================
-# 🚀 INICIAR NO READY
-# ===============================
-
-@bot.event
-async def on_ready():
-    if not enviar_pista_tesouro.is_running():
-        enviar_pista_tesouro.start()
-
-bot.run(DISCORD_TOKEN)
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
@@ -0,0 +1,110 @@
+# ===============================
+# 🧪 OBJETOS FALSOS DO DISCORD PARA OS BENCHMARKS
+# ===============================
+# Importa o Main.py sem bot.run e imita só o que os handlers usam de
+# discord.Message, discord.Interaction e guilds. Compartilhado pelos
+# scripts de bench/ (rodados como `python bench/<script>.py`).
+import os
+import sys
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_ID = 999
+
+TEXTOS = (
+    "bom dia galera",
+    "alguém joga hoje à noite?",
+    "kkkkkkkk",
+    "olha esse meme que eu achei ontem, muito bom",
+    "vou dormir, até amanhã pessoal",
+    "quem ganhou o sorteio?",
+)
+
+
+def importar_main(db_path: str, **env):
+    # env: variáveis extras do bot (DB_READERS, GROQ_BASE_URL, IA_DEBOUNCE...)
+    os.environ.setdefault("DISCORD_TOKEN", "bench")
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("FEEDBACK_CHANNEL_ID", "0")
+    os.environ.setdefault("OWNER_ID", "0")
+    os.environ["DB_PATH"] = db_path
+    for nome, valor in env.items():
+        if valor is not None:
+            os.environ[nome] = str(valor)
+
+    sys.path.insert(0, RAIZ)
+    import Main
+    Main.bot._connection.user = types.SimpleNamespace(id=BOT_ID, bot=True)
+    return Main
+
+
+def guild_falsa(gid: int, membros: int = 100):
+    return types.SimpleNamespace(id=gid, name=f"guild {gid}", member_count=membros)
+
+
+# ---------- mensagens ----------
+class RespostaFalsa:
+    # a mensagem que o bot mandou; edições vão para o mesmo observador
+    def __init__(self, ao_ver):
+        self._ao_ver = ao_ver
+
+    async def edit(self, content=None, **kwargs):
+        if self._ao_ver:
+            self._ao_ver(content)
+
+    async def delete(self):
+        pass
+
+
+class MensagemFalsa:
+    # ao_ver(content) recebe cada reply e cada edição feita pelo bot
+    def __init__(self, uid: int, content: str, guild=None, mentions=(), canal: int = None, ao_ver=None):
+        self.author = types.SimpleNamespace(id=uid, bot=False)
+        self.channel = types.SimpleNamespace(id=uid if canal is None else canal)
+        self.guild = guild
+        self.content = content
+        self.mentions = list(mentions)
+        self.reference = None
+        self.attachments = []
+        self._state = None
+        self._ao_ver = ao_ver
+
+    async def reply(self, content=None, **kwargs):
+        if self._ao_ver:
+            self._ao_ver(content)
+        return RespostaFalsa(self._ao_ver)
+
+
+# ---------- interações (slash commands) ----------
+class RespostaInteracao:
+    def __init__(self):
+        self.feita = False
+
+    async def send_message(self, content=None, **kwargs):
+        self.feita = True
+
+    async def defer(self, **kwargs):
+        self.feita = True
+
+    async def edit_message(self, **kwargs):
+        self.feita = True
+
+    def is_done(self) -> bool:
+        return self.feita
+
+
+class InteracaoFalsa:
+    def __init__(self, uid: int, guild):
+        self.user = types.SimpleNamespace(
+            id=uid, bot=False, name=f"user{uid}", display_name=f"user{uid}", mention=f"<@{uid}>"
+        )
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.channel = types.SimpleNamespace(id=(guild.id * 10 if guild else 0) + uid % 10)
+        self.extras = {}
+        self.command_failed = False
+        self.response = RespostaInteracao()
+        self.followup = types.SimpleNamespace(send=self._followup)
+
+    async def _followup(self, *args, **kwargs):
+        pass
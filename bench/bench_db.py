@@ -0,0 +1,163 @@
+# ===============================
+# 📊 BENCHMARK: LEITURAS x RENDA PASSIVA
+# ===============================
+# Mede quantas leituras por segundo os comandos de consulta
+# (/saldo_cmd, /ranking, /userinfo) conseguem fazer com o banco ocioso
+# e com o caminho de escrita da renda passiva saturado. As leituras vão
+# direto ao banco (as mesmas consultas de uma falta no cache de perfis e
+# do Leaderboard), sem passar pelo cache em memória.
+#
+# Uso:
+#   python bench/bench_db.py --users 50000 --seconds 5 --rate 20000 --readers 0 4
+#
+# readers=0 reproduz o comportamento antigo (leituras na fila de escrita).
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from _falsos import importar_main
+
+
+def popular(Main, users: int):
+    def job(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, coins, banco, xp) VALUES (?, ?, ?, ?)",
+            (
+                (uid, random.randint(0, 10**6), random.randint(0, 10**6), random.randint(0, 10**5))
+                for uid in range(1, users + 1)
+            )
+        )
+    Main.db.run_sync(job)
+
+
+async def leitor(Main, users: int, fim: float, latencias: list) -> int:
+    paginas = max(1, min(users // Main.RANKING_POR_PAGINA, 100))
+    consultas = (
+        # perfil na falta do cache (/saldo_cmd, /userinfo)
+        lambda uid: Main.db.fetchone(
+            "SELECT u.coins, u.banco, u.xp, u.last_daily, u.last_weekly, u.last_work, "
+            "u.last_accrual, s.seq FROM ledger_seq s LEFT JOIN users u ON u.user_id=?",
+            (uid,)
+        ),
+        # /ranking: página e posição de quem chamou
+        lambda uid: Main.ranking_pix.pagina(random.randint(1, paginas)),
+        lambda uid: Main.ranking_pix.posicao(uid),
+    )
+    feitas = 0
+    while time.perf_counter() < fim:
+        t0 = time.perf_counter()
+        await random.choice(consultas)(random.randint(1, users))
+        latencias.append(time.perf_counter() - t0)
+        feitas += 1
+    return feitas
+
+
+async def escritor(Main, users: int, fim: float, taxa: int) -> int:
+    # mensagens chegando a `taxa`/s; o flusher abaixo grava sem pausa,
+    # então a thread de escrita fica 100% ocupada durante a fase
+    creditos = 0
+    inicio = time.perf_counter()
+    while time.perf_counter() < fim:
+        alvo = int((time.perf_counter() - inicio) * taxa)
+        for _ in range(alvo - creditos):
+            await Main.ledger.creditar(random.randint(1, users), 2)
+        creditos = max(creditos, alvo)
+        await asyncio.sleep(0.001)
+    return creditos
+
+
+async def flusher(Main, fim: float) -> int:
+    lotes = 0
+    while time.perf_counter() < fim:
+        if len(Main.ledger):
+            await Main.ledger.flush()
+            lotes += 1
+        else:
+            await asyncio.sleep(0)
+    return lotes
+
+
+async def fase(Main, args, com_escrita: bool) -> dict:
+    users, segundos, n_leitores = args.users, args.seconds, args.concurrency
+    fim = time.perf_counter() + segundos
+    latencias = []
+    leituras = [leitor(Main, users, fim, latencias) for _ in range(n_leitores)]
+    escritas = [escritor(Main, users, fim, args.rate), flusher(Main, fim)] if com_escrita else []
+
+    resultados = await asyncio.gather(*leituras, *escritas)
+    lidas = sum(resultados[:n_leitores])
+    latencias.sort()
+    out = {
+        "reads_s": lidas / segundos,
+        "p50_ms": latencias[len(latencias) // 2] * 1000,
+        "p99_ms": latencias[int(len(latencias) * 0.99)] * 1000,
+    }
+    if com_escrita:
+        out["credits_s"] = resultados[n_leitores] / segundos
+        out["flushes_s"] = resultados[n_leitores + 1] / segundos
+    return out
+
+
+def worker(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        Main = importar_main(os.path.join(tmp, "bench.db"), DB_READERS=args.worker)
+        popular(Main, args.users)
+
+        async def main():
+            ocioso = await fase(Main, args, False)
+            carga = await fase(Main, args, True)
+            await Main.ledger.flush()
+            return ocioso, carga
+
+        ocioso, carga = asyncio.run(main())
+        Main.db.close()
+
+    print(json.dumps({"readers": args.worker, "idle": ocioso, "load": carga}))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--users", type=int, default=50_000)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--concurrency", type=int, default=16, help="leitores simultâneos")
+    p.add_argument("--rate", type=int, default=20_000, help="mensagens/s na renda passiva")
+    p.add_argument("--readers", type=int, nargs="+", default=[0, 4], help="tamanhos de pool a comparar")
+    p.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker is not None:
+        return worker(args)
+
+    print(
+        f"{'pool':>5} | {'leituras/s ocioso':>18} | {'leituras/s c/ escrita':>22} | "
+        f"{'retenção':>8} | {'p99 ocioso':>10} | {'p99 c/ escrita':>14} | {'flushes/s':>10}"
+    )
+    for readers in args.readers:
+        out = subprocess.run(
+            [
+                sys.executable, __file__,
+                "--worker", str(readers),
+                "--users", str(args.users),
+                "--seconds", str(args.seconds),
+                "--concurrency", str(args.concurrency),
+                "--rate", str(args.rate),
+            ],
+            check=True, capture_output=True, text=True
+        ).stdout.strip().splitlines()[-1]
+        res = json.loads(out)
+        idle, load = res["idle"]["reads_s"], res["load"]["reads_s"]
+        print(
+            f"{readers:>5} | {idle:>18.0f} | {load:>22.0f} | "
+            f"{load / idle:>7.0%} | {res['idle']['p99_ms']:>8.1f}ms | "
+            f"{res['load']['p99_ms']:>12.1f}ms | {res['load']['flushes_s']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# ===============================
+# 📊 BENCHMARK: IA (ask_groq / on_message)
+# ===============================
+# Sobe o servidor falso da Groq (bench/groq_mock.py) num processo
+# separado, aponta o bot para ele via GROQ_BASE_URL e dispara conversas
+# simultâneas, medindo latência (p50/p95/p99), tempo até o primeiro
+# texto visível e vazão.
+#
+# Uso:
+#   python bench/bench_ia.py --modo ask --concurrency 32 --seconds 10
+#   python bench/bench_ia.py --modo on_message --streaming --latencia 0.5 --erro 0.05
+#
+# --repetir manda "Oi!" de usuários novos (mede o cache de respostas).
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from _falsos import BOT_ID, RAIZ, MensagemFalsa, importar_main
+
+
+def subir_mock(args) -> tuple:
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.join(RAIZ, "bench", "groq_mock.py"),
+            "--port", str(args.port),
+            "--latencia", str(args.latencia),
+            "--por-token", str(args.por_token),
+            "--tokens", str(args.tokens),
+            "--erro", str(args.erro),
+            "--limite", str(args.limite),
+        ],
+        stdout=subprocess.PIPE, text=True
+    )
+    linha = proc.stdout.readline().strip()
+    url = linha.split("=", 1)[1]
+    # espera a porta abrir
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/stats", timeout=1).read()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return proc, url
+
+
+class Medicao:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.primeiro = None
+        self.fim = asyncio.get_running_loop().create_future()
+        self.texto = ""
+
+    def ver(self, content: str):
+        if content == "💭 ...":
+            return  # o placeholder não conta como texto visível
+        agora = time.perf_counter()
+        if self.primeiro is None:
+            self.primeiro = agora
+        if not content.endswith(" ▌") and not self.fim.done():
+            self.texto = content
+            self.fim.set_result(agora)
+
+
+def classificar(texto: str) -> str:
+    if texto.startswith(("💜 Calma", "💜 Estou conversando")):
+        return "ocupada"
+    if texto.startswith("💜 Tive um erro"):
+        return "erro"
+    return "ok"
+
+
+async def conversa(Main, args, w: int, fim: float, res: dict):
+    uid = 10_000 + w
+    k = 0
+    while time.perf_counter() < fim:
+        k += 1
+        texto = f"pergunta {w} {k}"
+        if args.repetir:
+            # usuário novo a cada vez: mesmo contexto, mesma chave de cache
+            uid, texto = 10_000 + w * 1_000_000 + k, "Oi!"
+        med = Medicao()
+
+        if args.modo == "ask":
+            try:
+                await Main.ask_groq(
+                    uid, texto,
+                    ao_parcial=med.ver if args.streaming else None
+                )
+                med.ver("ok")
+                tipo = "ok"
+            except Main.IAOcupada:
+                tipo = "ocupada"
+            except Exception:
+                tipo = "erro"
+            t_fim = time.perf_counter()
+        else:
+            await Main.on_message(MensagemFalsa(
+                uid, f"<@{BOT_ID}> {texto}", mentions=[Main.bot.user], ao_ver=med.ver
+            ))
+            t_fim = await med.fim
+            tipo = classificar(med.texto)
+
+        res[tipo] += 1
+        if tipo == "ok":
+            res["lat"].append(t_fim - med.inicio)
+            res["ttfv"].append((med.primeiro or t_fim) - med.inicio)
+
+
+def pct(valores: list, p: float) -> float:
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+
+async def rodar(Main, args) -> dict:
+    res = {"ok": 0, "ocupada": 0, "erro": 0, "lat": [], "ttfv": []}
+    fim = time.perf_counter() + args.seconds
+    t0 = time.perf_counter()
+    await asyncio.gather(*(conversa(Main, args, w, fim, res) for w in range(args.concurrency)))
+    res["duracao"] = time.perf_counter() - t0
+    await Main.groq.close()
+    return res
+
+
+def main():
+    global Main
+    p = argparse.ArgumentParser()
+    p.add_argument("--modo", choices=("ask", "on_message"), default="ask")
+    p.add_argument("--concurrency", type=int, default=16, help="conversas simultâneas")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--streaming", action="store_true")
+    p.add_argument("--debounce", type=float, default=0.0, help="IA_DEBOUNCE do bot")
+    p.add_argument("--repetir", action="store_true", help="sempre \"Oi!\" de usuários novos")
+    p.add_argument("--port", type=int, default=8787)
+    p.add_argument("--latencia", type=float, default=0.3)
+    p.add_argument("--por-token", type=float, default=0.01)
+    p.add_argument("--tokens", type=int, default=60)
+    p.add_argument("--erro", type=float, default=0.0)
+    p.add_argument("--limite", type=float, default=0.0)
+    args = p.parse_args()
+
+    mock, url = subir_mock(args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            Main = importar_main(
+                os.path.join(tmp, "bench.db"),
+                GROQ_BASE_URL=url,
+                IA_STREAMING="1" if args.streaming else "0",
+                IA_DEBOUNCE=args.debounce,
+            )
+            res = asyncio.run(rodar(Main, args))
+            Main.db.close()
+        stats = urllib.request.urlopen(f"{url}/stats", timeout=5).read().decode()
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    total = res["ok"] + res["ocupada"] + res["erro"]
+    print(f"modo={args.modo} concorrência={args.concurrency} streaming={args.streaming} "
+          f"latência mock={args.latencia}s erro={args.erro} 429={args.limite}")
+    print(f"respostas: {total} (ok {res['ok']}, ocupada {res['ocupada']}, erro {res['erro']})")
+    print(f"vazão: {res['ok'] / res['duracao']:.1f} respostas/s")
+    print(
+        f"latência ms: p50 {pct(res['lat'], .50):.0f} | p95 {pct(res['lat'], .95):.0f} | "
+        f"p99 {pct(res['lat'], .99):.0f}"
+    )
+    print(
+        f"1º texto ms: p50 {pct(res['ttfv'], .50):.0f} | p95 {pct(res['ttfv'], .95):.0f} | "
+        f"p99 {pct(res['ttfv'], .99):.0f}"
+    )
+    print(f"cache: {Main.cache_ia.hits} hits / {Main.cache_ia.misses} misses")
+    print(f"mock: {stats}")
+
+
+if __name__ == "__main__":
+    main()
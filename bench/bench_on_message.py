@@ -0,0 +1,131 @@
+# ===============================
+# 📊 MICRO-BENCHMARK: on_message
+# ===============================
+# Compara o custo de CPU por mensagem do despacho rápido (Main.on_message)
+# com o on_message antigo, que checava DM por isinstance, percorria a
+# lista de menções e chamava process_commands em toda mensagem.
+#
+# Uso:
+#   python bench/bench_on_message.py --mensagens 200000
+#
+# A IA é trocada por um contador: mede só o despacho, não a resposta.
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import types
+
+from _falsos import BOT_ID, TEXTOS, MensagemFalsa, guild_falsa, importar_main
+
+
+def gerar(Main, n: int) -> list:
+    # mistura típica de um servidor: quase tudo é conversa comum
+    guild = guild_falsa(1)
+    outros = [types.SimpleNamespace(id=k) for k in range(3)]
+    msgs = []
+    for k in range(n):
+        uid = random.randint(1, 5000)
+        sorteio = random.random()
+        texto = random.choice(TEXTOS)
+        if sorteio < 0.90:
+            msgs.append(("comum", MensagemFalsa(uid, texto, guild, outros[:random.randint(0, 3)], uid % 50)))
+        elif sorteio < 0.95:
+            msgs.append(("mencao", MensagemFalsa(uid, f"<@{BOT_ID}> {texto}", guild, [Main.bot.user], uid % 50)))
+        elif sorteio < 0.98:
+            msgs.append(("dm", MensagemFalsa(uid, texto, canal=uid % 50)))
+        else:
+            msgs.append(("prefixo", MensagemFalsa(uid, "~ping", guild, canal=uid % 50)))
+    return msgs
+
+
+def on_message_antigo(Main):
+    # cópia do handler antes do despacho rápido
+    bot = Main.bot
+
+    async def on_message(message):
+        if message.author.bot:
+            return
+
+        uid = message.author.id
+
+        await Main.ledger.creditar(uid, int(2 * Main.vip_bonus(uid)))
+
+        is_dm = isinstance(message.channel, Main.discord.DMChannel) or message.guild is None
+        is_mention = bot.user in message.mentions
+
+        if is_dm or is_mention:
+            content = message.content.replace(f"<@{bot.user.id}>", "").strip()
+            if not content:
+                content = "Oi!"
+
+            Main.agrupador_ia.receber(message, content)
+
+        await bot.process_commands(message)
+
+    return on_message
+
+
+async def medir(handler, msgs: list) -> dict:
+    por_tipo = {}
+    for tipo, msg in msgs:
+        t0 = time.perf_counter()
+        await handler(msg)
+        dt = time.perf_counter() - t0
+        soma, n = por_tipo.get(tipo, (0.0, 0))
+        por_tipo[tipo] = (soma + dt, n + 1)
+    return por_tipo
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--mensagens", type=int, default=200_000)
+    p.add_argument("--rodadas", type=int, default=3)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Main = importar_main(os.path.join(tmp, "bench.db"))
+        ias = [0]
+        Main.agrupador_ia.receber = lambda message, content: ias.__setitem__(0, ias[0] + 1)
+        # o ledger só grava no flush; aqui ele só acumula em memória
+        Main.LEDGER_FLUSH_ENTRADAS = Main.LEDGER_MAX_ENTRADAS = 10**9
+
+        # um comando de prefixo qualquer, para os dois handlers terem o que despachar
+        @Main.bot.command(name="ping")
+        async def ping(ctx):
+            pass
+
+        msgs = gerar(Main, args.mensagens)
+        handlers = {"antigo": on_message_antigo(Main), "despacho": Main.on_message}
+
+        async def rodar():
+            await Main.bot._async_setup_hook()  # loop do bot para o dispatch de eventos
+            melhores = {}
+            for _ in range(args.rodadas):
+                for nome, handler in handlers.items():
+                    t0 = time.process_time()
+                    por_tipo = await medir(handler, msgs)
+                    cpu = time.process_time() - t0
+                    if nome not in melhores or cpu < melhores[nome][0]:
+                        melhores[nome] = (cpu, por_tipo)
+            return melhores
+
+        melhores = asyncio.run(rodar())
+        Main.db.close()
+
+    print(f"{args.mensagens} mensagens, melhor de {args.rodadas} rodadas")
+    print(f"{'handler':>9} | {'CPU µs/msg':>10} | " + " | ".join(f"{t:>8}" for t in ("comum", "mencao", "dm", "prefixo")))
+    for nome, (cpu, por_tipo) in melhores.items():
+        colunas = []
+        for tipo in ("comum", "mencao", "dm", "prefixo"):
+            soma, n = por_tipo.get(tipo, (0.0, 1))
+            colunas.append(f"{soma / n * 1e6:>6.2f}µs")
+        print(f"{nome:>9} | {cpu / args.mensagens * 1e6:>10.2f} | " + " | ".join(colunas))
+
+    antigo, novo = melhores["antigo"][0], melhores["despacho"][0]
+    print(f"redução de CPU por mensagem: {1 - novo / antigo:.0%}")
+
+
+if __name__ == "__main__":
+    main()
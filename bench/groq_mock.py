@@ -0,0 +1,146 @@
+# ===============================
+# 🧪 SERVIDOR FALSO DA GROQ (API COMPATÍVEL COM OPENAI)
+# ===============================
+# Responde POST /openai/v1/chat/completions como a Groq, com latência,
+# streaming de tokens, erros e 429 configuráveis. Para apontar o bot:
+#
+#   python bench/groq_mock.py --port 8787 --latencia 0.3 --por-token 0.01
+#   GROQ_BASE_URL=http://127.0.0.1:8787 python Main.py
+#
+# --erro e --limite são probabilidades (0..1) por requisição.
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+PALAVRAS = (
+    "oi", "tudo", "bem", "com", "você", "hoje", "💜", "que", "legal",
+    "me", "conta", "mais", "sobre", "isso", "haha", "claro", "!",
+)
+
+
+def _tokens_prompt(messages: list) -> int:
+    return sum(len(m.get("content") or "") // 4 + 4 for m in messages)
+
+
+def criar_app(
+    latencia: float = 0.3,
+    por_token: float = 0.01,
+    tokens: int = 60,
+    erro: float = 0.0,
+    limite: float = 0.0,
+    retry_after: float = 1.0,
+) -> web.Application:
+    stats = {"requisicoes": 0, "erros": 0, "limitadas": 0}
+
+    async def completions(request: web.Request):
+        stats["requisicoes"] += 1
+        corpo = await request.json()
+
+        if random.random() < limite:
+            stats["limitadas"] += 1
+            return web.json_response(
+                {"error": {
+                    "message": "Rate limit reached for model (mock)",
+                    "type": "tokens",
+                    "code": "rate_limit_exceeded",
+                }},
+                status=429,
+                headers={"retry-after": str(retry_after)},
+            )
+
+        await asyncio.sleep(latencia)
+
+        if random.random() < erro:
+            stats["erros"] += 1
+            return web.json_response(
+                {"error": {"message": "mock internal error", "type": "internal_server_error"}},
+                status=500,
+            )
+
+        n = min(tokens, corpo.get("max_tokens") or tokens)
+        partes = [random.choice(PALAVRAS) + " " for _ in range(n)]
+        uso = {
+            "prompt_tokens": _tokens_prompt(corpo.get("messages", [])),
+            "completion_tokens": n,
+            "total_tokens": _tokens_prompt(corpo.get("messages", [])) + n,
+        }
+        cid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        criado = int(time.time())
+        modelo = corpo.get("model", "mock")
+
+        if not corpo.get("stream"):
+            await asyncio.sleep(por_token * n)
+            return web.json_response({
+                "id": cid,
+                "object": "chat.completion",
+                "created": criado,
+                "model": modelo,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(partes)},
+                    "finish_reason": "stop",
+                }],
+                "usage": uso,
+            })
+
+        resp = web.StreamResponse(headers={"content-type": "text/event-stream"})
+        await resp.prepare(request)
+
+        async def evento(delta: dict, fim=None, extra=None):
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": criado,
+                "model": modelo,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": fim}],
+            }
+            if extra:
+                chunk.update(extra)
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await evento({"role": "assistant", "content": ""})
+        for parte in partes:
+            await asyncio.sleep(por_token)
+            await evento({"content": parte})
+        await evento({}, "stop", {"x_groq": {"id": cid, "usage": uso}})
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def ver_stats(request: web.Request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_post("/openai/v1/chat/completions", completions)
+    app.router.add_get("/stats", ver_stats)
+    return app
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8787)
+    p.add_argument("--latencia", type=float, default=0.3, help="segundos até o 1º token")
+    p.add_argument("--por-token", type=float, default=0.01, help="segundos entre tokens")
+    p.add_argument("--tokens", type=int, default=60, help="tokens por resposta")
+    p.add_argument("--erro", type=float, default=0.0, help="chance de 500")
+    p.add_argument("--limite", type=float, default=0.0, help="chance de 429")
+    p.add_argument("--retry-after", type=float, default=1.0)
+    args = p.parse_args()
+
+    app = criar_app(
+        args.latencia, args.por_token, args.tokens,
+        args.erro, args.limite, args.retry_after
+    )
+    print(f"GROQ_BASE_URL=http://{args.host}:{args.port}", flush=True)
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# ===============================
+# 📊 TESTE DE CARGA: GATEWAY SINTÉTICO
+# ===============================
+# Importa o Main.py sem bot.run, monta mensagens, interações e guilds
+# falsas e dispara on_message e os callbacks dos slash commands na taxa
+# e na quantidade de usuários pedidas. A chegada é aberta, como no
+# gateway: cada evento vira uma task no instante previsto, e a latência
+# conta da chegada prevista até o fim (inclui a fila do loop).
+#
+# Uso:
+#   python bench/loadtest.py --taxa 10000 --usuarios 100000 --mencoes 0.05
+#   python bench/loadtest.py --taxa 2000 --comandos 300 --ia mock --latencia 0.5
+#
+# --ia contador troca a IA por um contador (mede só o despacho);
+# --ia mock sobe o bench/groq_mock.py e responde de verdade.
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import types
+
+from _falsos import BOT_ID, TEXTOS, InteracaoFalsa, MensagemFalsa, guild_falsa, importar_main
+
+# (comando, peso, argumentos)
+COMANDOS = (
+    ("saldo_cmd", 30, lambda: {}),
+    ("level", 15, lambda: {}),
+    ("daily", 10, lambda: {}),
+    ("work", 10, lambda: {}),
+    ("crime", 10, lambda: {}),
+    ("deposit", 10, lambda: {"valor": random.randint(1, 500)}),
+    ("withdraw", 10, lambda: {"valor": random.randint(1, 500)}),
+    ("economia", 5, lambda: {}),
+)
+
+
+class Carga:
+    def __init__(self, Main, args):
+        self.Main = Main
+        self.args = args
+        self.hist = {}
+        self.erros = {}
+        self.primeiro_erro = None
+        self.ia_pedidas = 0
+        self.feitos = {"mensagem": 0, "comando": 0}
+        self._tasks = set()
+        self.guilds = [guild_falsa(g, random.randint(10, 50_000)) for g in range(1, args.guilds + 1)]
+        self._outros = [types.SimpleNamespace(id=k) for k in range(3)]
+        nomes, pesos, argumentos = zip(*COMANDOS)
+        self._comandos = nomes
+        self._pesos = pesos
+        self._argumentos = dict(zip(nomes, argumentos))
+
+    def medir(self, tipo: str, previsto: float):
+        h = self.hist.get(tipo)
+        if h is None:
+            h = self.hist[tipo] = self.Main.Histograma()
+        h.registrar(int((time.perf_counter() - previsto) * 1_000_000))
+
+    def falhou(self, tipo: str, e: Exception):
+        self.erros[tipo] = self.erros.get(tipo, 0) + 1
+        if self.primeiro_erro is None:
+            self.primeiro_erro = f"{tipo}: {type(e).__name__}: {e}"
+
+    def resposta_ia(self, previsto: float):
+        def ver(content):
+            # a resposta da IA termina quando chega um texto sem o cursor
+            if content and content != "💭 ..." and not content.endswith(" ▌"):
+                self.medir("ia", previsto)
+        return ver
+
+    async def mensagem(self, previsto: float):
+        a = self.args
+        uid = random.randint(1, a.usuarios)
+        texto = random.choice(TEXTOS)
+        sorteio = random.random()
+        if sorteio < a.dms:
+            tipo, msg = "dm", MensagemFalsa(uid, texto, ao_ver=self.resposta_ia(previsto))
+        else:
+            guild = random.choice(self.guilds)
+            canal = guild.id * 10 + uid % 10
+            if sorteio < a.dms + a.mencoes:
+                tipo, msg = "mencao", MensagemFalsa(
+                    uid, f"<@{BOT_ID}> {texto} {uid}", guild, [self.Main.bot.user],
+                    canal, self.resposta_ia(previsto)
+                )
+            else:
+                tipo, msg = "comum", MensagemFalsa(
+                    uid, texto, guild, self._outros[:random.randint(0, 3)], canal
+                )
+
+        try:
+            await self.Main.on_message(msg)
+        except Exception as e:
+            self.falhou(tipo, e)
+        self.medir(tipo, previsto)
+        self.feitos["mensagem"] += 1
+
+    async def comando(self, previsto: float):
+        nome = random.choices(self._comandos, self._pesos)[0]
+        i = InteracaoFalsa(random.randint(1, self.args.usuarios), random.choice(self.guilds))
+        try:
+            await getattr(self.Main, nome).callback(i, **self._argumentos[nome]())
+        except Exception as e:
+            self.falhou(f"/{nome}", e)
+        self.medir(f"/{nome}", previsto)
+        self.feitos["comando"] += 1
+
+    async def gerar(self, evento, taxa: float, inicio: float):
+        # um task por evento, como o discord.py faz com cada dispatch
+        total = int(taxa * self.args.segundos)
+        k = 0
+        while k < total:
+            devidos = min(total, int((time.perf_counter() - inicio) * taxa) + 1)
+            while k < devidos:
+                task = asyncio.create_task(evento(inicio + k / taxa))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                k += 1
+            await asyncio.sleep(0.001)
+
+    async def rodar(self):
+        a = self.args
+        inicio = time.perf_counter() + 0.05
+        geradores = [self.gerar(self.mensagem, a.taxa, inicio)]
+        if a.comandos:
+            geradores.append(self.gerar(self.comando, a.comandos, inicio))
+        await asyncio.gather(*geradores)
+        self.gerado = time.perf_counter() - inicio
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        self.duracao = time.perf_counter() - inicio
+
+
+def popular(Main, usuarios: int):
+    def job(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, coins, banco, xp) VALUES (?, ?, ?, ?)",
+            (
+                (uid, random.randint(0, 10**5), random.randint(0, 10**5), random.randint(0, 10**4))
+                for uid in range(1, usuarios + 1)
+            )
+        )
+    Main.db.run_sync(job)
+
+
+def tamanho(db_path: str) -> int:
+    return sum(
+        os.path.getsize(db_path + sufixo)
+        for sufixo in ("", "-wal", "-shm")
+        if os.path.exists(db_path + sufixo)
+    )
+
+
+def mb(n: int, sinal: str = "") -> str:
+    return f"{n / 1024 / 1024:{sinal}.1f}MB"
+
+
+async def executar(Main, args, db_path: str) -> tuple:
+    carga = Carga(Main, args)
+    if args.ia == "contador":
+        def contar(message, content):
+            carga.ia_pedidas += 1
+        Main.agrupador_ia.receber = contar
+
+    # mesmo boot do bot real: flush do ledger, memória da IA, lag do loop...
+    await Main.bot._async_setup_hook()
+    await Main.bot.setup_hook()
+
+    antes = (await Main.db.fetchval("SELECT COUNT(*) FROM users", (), 0), tamanho(db_path))
+    cpu = time.process_time()
+    await carga.rodar()
+    carga.cpu = time.process_time() - cpu
+    # espera as últimas rajadas da IA terminarem (ou desistirem na fila)
+    limite = time.perf_counter() + Main.IA_ESPERA_MAX + Main.IA_TIMEOUT
+    while len(Main.agrupador_ia) and time.perf_counter() < limite:
+        await asyncio.sleep(0.05)
+
+    await Main.ledger.flush()
+    await Main.uso_ia.flush()
+    await Main.memoria_ia.flush()
+    depois = (await Main.db.fetchval("SELECT COUNT(*) FROM users", (), 0), None)
+
+    await Main.metricas.parar()
+    Main.vigia.parar()
+    await Main.groq.close()
+    return carga, antes, depois
+
+
+def relatorio(Main, args, carga: Carga, antes: tuple, depois: tuple):
+    a = args
+    print(
+        f"alvo: {a.taxa:.0f} msg/s + {a.comandos:.0f} cmd/s por {a.segundos:.0f}s • "
+        f"{a.usuarios} usuários em {a.guilds} guilds • {a.mencoes:.0%} menções, {a.dms:.0%} DMs • IA {a.ia}"
+    )
+    print(
+        f"entregue: {carga.feitos['mensagem'] / carga.duracao:.0f} msg/s, "
+        f"{carga.feitos['comando'] / carga.duracao:.0f} cmd/s "
+        f"(gerador {carga.gerado:.2f}s, tudo concluído em {carga.duracao:.2f}s, "
+        f"CPU {carga.cpu / max(1, sum(carga.feitos.values())) * 1e6:.1f}µs/evento)"
+    )
+
+    print(f"\n{'tipo':<12}{'n':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'erros':>7}")
+    for tipo, h in sorted(carga.hist.items(), key=lambda kv: -kv[1].n):
+        p50, p95, p99 = h.percentis((.5, .95, .99))
+        print(
+            f"{tipo:<12}{h.n:>9}{Main.fmt_us(p50):>9}{Main.fmt_us(p95):>9}"
+            f"{Main.fmt_us(p99):>9}{Main.fmt_us(h.maximo):>9}{carga.erros.get(tipo, 0):>7}"
+        )
+    if carga.primeiro_erro:
+        print(f"primeiro erro: {carga.primeiro_erro}")
+    if a.ia == "contador":
+        print(f"IA: {carga.ia_pedidas} pedidos contados (não respondidos)")
+
+    print(
+        f"\nloop: lag máx {Main.metricas.lag_max * 1000:.0f}ms • "
+        f"{Main.vigia.travamentos} travamentos > {Main.VIGIA_LIMITE}s"
+    )
+    for local, info in Main.vigia.ranking()[:3]:
+        print(f"  {info['n']}x pior {info['pior']:.2f}s  {local}")
+
+    print(
+        f"banco: {antes[0]} → {depois[0]} usuários (+{depois[0] - antes[0]}), "
+        f"{mb(antes[1])} → {mb(depois[1])} ({mb(depois[1] - antes[1], '+')})"
+    )
+
+    print("\netapas internas (perf):")
+    print(Main._tabela_perf(Main.perf.ranking(), 10).strip("`\n"))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--taxa", type=float, default=10_000, help="mensagens/s")
+    p.add_argument("--comandos", type=float, default=200, help="slash commands/s")
+    p.add_argument("--segundos", type=float, default=10.0)
+    p.add_argument("--usuarios", type=int, default=100_000)
+    p.add_argument("--guilds", type=int, default=200)
+    p.add_argument("--mencoes", type=float, default=0.05, help="fração de mensagens que mencionam o bot")
+    p.add_argument("--dms", type=float, default=0.0, help="fração de mensagens em DM")
+    p.add_argument("--popular", action="store_true", help="cria todos os usuários antes de começar")
+    p.add_argument("--ia", choices=("contador", "mock"), default="contador")
+    p.add_argument("--port", type=int, default=8787)
+    p.add_argument("--latencia", type=float, default=0.3)
+    p.add_argument("--por-token", type=float, default=0.01)
+    p.add_argument("--tokens", type=int, default=60)
+    p.add_argument("--erro", type=float, default=0.0)
+    p.add_argument("--limite", type=float, default=0.0)
+    args = p.parse_args()
+
+    mock, url = None, None
+    if args.ia == "mock":
+        from bench_ia import subir_mock
+        mock, url = subir_mock(args)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "carga.db")
+            Main = importar_main(db_path, GROQ_BASE_URL=url)
+            if args.popular:
+                popular(Main, args.usuarios)
+            carga, antes, depois = asyncio.run(executar(Main, args, db_path))
+            Main.db.close()
+            depois = (depois[0], tamanho(db_path))
+            relatorio(Main, args, carga, antes, depois)
+    finally:
+        if mock:
+            mock.terminate()
+            mock.wait()
+
+
+if __name__ == "__main__":
+    main()